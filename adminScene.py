@@ -2,6 +2,7 @@ import customtkinter as ctk
 import tkinter as tk
 from tkinter import messagebox
 from database import Database
+from limits import Limits
 from styleManager import StyleManager
 from utils import hash_sha256
 from placeholderEntry import PlaceholderEntry
@@ -176,14 +177,12 @@ class AdminScene(ctk.CTkFrame):
         if not (name and password):
             messagebox.showwarning("Missing", "Both fields required 💔")
             return
+        if self.db.get_user_id(name) is not None:
+            messagebox.showwarning("Taken", f"User '{name}' already exists 💔")
+            return
         self.db.add_user(name, hash_sha256(password), is_admin)
 
-        print("\n=== User table ===")
-        for uid, uname, hpwd, adm in self.db.get_users():
-            print(f"{uid}\t{uname}\t{hpwd}\t{adm}")
-        print("==================\n")
-
-        messagebox.showinfo("Success", f"Created user '{name}'! 🎉")
+        messagebox.showinfo("Success", f"Created user '{name}' (#{self.db.get_user_id(name)})! 🎉")
         self._show_welcome()
 
     def _submit_task(self, entries, test_entries):
@@ -197,6 +196,16 @@ class AdminScene(ctk.CTkFrame):
             messagebox.showwarning("Missing", "Title, description, and rules required 💔")
             return
 
+        try:
+            time_limit = float(entries["Time limit (s)"].get().strip() or 0) or None
+            memory_mb = float(entries["Memory limit (MB)"].get().strip() or 0) or None
+            if (time_limit or 0) < 0 or (memory_mb or 0) < 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showwarning("Invalid", "Limits must be positive numbers 💔")
+            return
+        limits = Limits(time=time_limit, memory_kb=int(memory_mb * 1024) if memory_mb else None)
+
         tests = []
         for case_entry, ans_entry in test_entries:
             case = case_entry.get().strip()
@@ -208,17 +217,12 @@ class AdminScene(ctk.CTkFrame):
                 tests.append((case, ans))
 
         try:
-            self.db.add_task(title, desc, exp, rules, tests if tests else None)
+            task_id = self.db.add_task(title, desc, exp, rules, tests if tests else None, limits)
         except Exception as exc:
             messagebox.showerror("DB Error", f"Failed to add task: {exc}")
             return
 
-        print("\n=== Task table ===")
-        for tid, ttitle, tdesc, texp, trules in self.db.get_tasks():
-            print(f"{tid}\t{ttitle}\t{tdesc}\t{texp}\t{trules}")
-        print("==================\n")
-
-        messagebox.showinfo("Success", "Task added! 🚀")
+        messagebox.showinfo("Success", f"Task #{task_id} '{title}' added! 🚀")
         self._show_welcome()
 
     def _add_task(self):
@@ -232,7 +236,8 @@ class AdminScene(ctk.CTkFrame):
         ).pack(pady=20)
 
         entries = {}
-        for label in ("Title", "Description", "Expiration (YYYY-MM-DD)", "Validation Rules"):
+        for label in ("Title", "Description", "Expiration (YYYY-MM-DD)", "Validation Rules",
+                      "Time limit (s)", "Memory limit (MB)"):
             e = ctk.CTkEntry(
                 self.content,
                 placeholder_text=f"✍️ {label}",
@@ -346,7 +351,7 @@ class AdminScene(ctk.CTkFrame):
                 text_color="#f09c3a"
             ).grid(row=0, column=col, padx=20, pady=5, sticky="w")
 
-        for row, (uid, name, _, adm) in enumerate(self.db.get_users(), 1):
+        for row, (uid, name, adm, _) in enumerate(self.db.list_users(), 1):
             ctk.CTkLabel(
                 scrollable_frame,
                 text=str(uid),
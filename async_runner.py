@@ -0,0 +1,317 @@
+"""asyncio counterpart of :class:`docker_runner.DockerTaskRunner`.
+
+:class:`AsyncTaskRunner` starts every sandbox as an asyncio subprocess: a
+``docker run`` through the Docker CLI or, without Docker, ``python`` on the
+host under :class:`local_sandbox.LocalSandbox` limits. Many runs can then be
+awaited together with ``asyncio.gather`` instead of parking a thread on each
+blocking Docker call. Runs go through :mod:`sandbox_harness` just like the
+blocking runner, so the records (and verdicts) are the same::
+
+    runner = AsyncTaskRunner(max_concurrency=8)
+    results, passed = await async_check_solution(tests, code=code, runner=runner)
+
+See :func:`task_checker.async_check_solution`.
+"""
+import asyncio
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+
+from container_pool import SANDBOX_USER, SCRATCH_TMPFS, share_with_sandbox
+from docker_runner import MAX_CONCURRENT_SANDBOXES, _sandbox_slots, harness_results, staged_harness
+from limits import Limits
+from local_sandbox import CGROUP_ROOT, LocalSandbox, parse_size
+from logger import log
+from run_watchdog import GRACE
+from sandbox_harness import cap_output, report_limit
+
+# seconds between attempts to take a host-wide sandbox slot
+SLOT_POLL = 0.02
+
+
+async def _docker_available() -> bool:
+    """Whether the ``docker`` CLI exists and reaches a daemon."""
+    if shutil.which("docker") is None:
+        return False
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            "docker", "version", "--format", "{{.Server.Version}}",
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+    except OSError:
+        return False
+    try:
+        return await asyncio.wait_for(proc.wait(), 10) == 0
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return False
+
+
+@asynccontextmanager
+async def _host_slot():
+    """Hold one of :mod:`docker_runner`'s host-wide sandbox slots without blocking the loop.
+
+    Polled rather than waited for in a worker thread, so a cancelled waiter
+    can never take a slot it does not release.
+    """
+    while not _sandbox_slots.acquire(blocking=False):
+        await asyncio.sleep(SLOT_POLL)
+    try:
+        yield
+    finally:
+        _sandbox_slots.release()
+
+
+class AsyncTaskRunner:
+    """Run Python solutions in sandboxes started as asyncio subprocesses.
+
+    The container limits mean the same as for :class:`DockerTaskRunner`.
+    Runs wait on a semaphore so that at most ``max_concurrency`` sandboxes of
+    this runner are active at once (default
+    :data:`docker_runner.MAX_CONCURRENT_SANDBOXES`), and on the host-wide cap
+    shared with the blocking runners. ``use_docker=None`` uses Docker when
+    the CLI can reach a daemon; the check runs on first use or in
+    :meth:`ready`.
+
+    The semaphore and the probe lock belong to the event loop running the
+    runner and are made again when a later ``asyncio.run`` reuses it; runs
+    from two loops at the same time are not supported.
+
+    Cancelling the task that awaits a run kills its sandbox.
+    """
+
+    def __init__(self,
+                 image: str = "python:3.10-slim",
+                 cpu_limit: float = 0.5,
+                 mem_limit: str = "512m",
+                 pids_limit: int = 64,
+                 *,
+                 max_concurrency: int | None = None,
+                 file_size_limit: str = "64m",
+                 cgroup_root: str | None = CGROUP_ROOT,
+                 use_docker: bool | None = None):
+        self.image = image
+        self.cpu_limit = cpu_limit
+        self.mem_limit = mem_limit
+        self.pids_limit = pids_limit
+        self.file_size_limit = parse_size(file_size_limit)
+        self.cgroup_root = cgroup_root
+        self.max_concurrency = max_concurrency or MAX_CONCURRENT_SANDBOXES
+        # asyncio primitives of the loop in self._loop; see _bind_loop
+        self._loop = None
+        self._slots = None
+        self._probe = None
+        self.use_docker = use_docker
+        self.local = None
+        if use_docker is False:
+            self._use_local()
+
+    def _use_local(self) -> None:
+        self.local = LocalSandbox(
+            cpu_limit=self.cpu_limit,
+            mem_limit=self.mem_limit,
+            pids_limit=self.pids_limit,
+            file_size_limit=self.file_size_limit,
+            cgroup_root=self.cgroup_root,
+        )
+
+    def _bind_loop(self) -> None:
+        """Create the semaphore and probe lock for the running loop if it changed."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._probe = asyncio.Lock()
+
+    async def ready(self) -> None:
+        """Pick the backend, probing for a Docker daemon if ``use_docker`` was ``None``."""
+        self._bind_loop()
+        async with self._probe:
+            if self.use_docker is None:
+                self.use_docker = await _docker_available()
+            if not self.use_docker and self.local is None:
+                self._use_local()
+
+    def backend_name(self) -> str:
+        """Short name of the backend, ``"docker"`` or ``"local"``; await :meth:`ready` first."""
+        if self.use_docker is None:
+            raise RuntimeError("backend not picked yet; await ready() first")
+        return "docker" if self.use_docker else "local"
+
+    def fingerprint(self) -> str:
+        """Describe the execution environment; matches :meth:`DockerTaskRunner.fingerprint`.
+
+        Only known once the backend is picked, so await :meth:`ready` first.
+        """
+        if self.use_docker is None:
+            raise RuntimeError("backend not picked yet; await ready() first")
+        if self.use_docker:
+            return f"docker:{self.image}:{self.cpu_limit}:{self.mem_limit}:{self.pids_limit}"
+        return f"local:{sys.version}:{self.local.fingerprint()}"
+
+    async def run_code(
+        self,
+        code: str | None = None,
+        *,
+        dir_path: str | Path | None = None,
+        entry: str = "main.py",
+        args: list[str] | None = None,
+        timeout: int = 5,
+        limits: Limits | None = None,
+        expected=None,
+    ) -> Dict[str, Any]:
+        """Run the solution once; see :meth:`DockerTaskRunner.run_code`."""
+        records = await self.run_batch(code, dir_path=dir_path, entry=entry, cases=[args or []],
+                                       timeout=timeout, limits=[limits], expected=[expected])
+        return records[0]
+
+    async def run_batch(
+        self,
+        code: str | None = None,
+        *,
+        dir_path: str | Path | None = None,
+        entry: str = "main.py",
+        cases: list[list[str]],
+        timeout: int = 5,
+        limits: list[Limits | None] | None = None,
+        expected: list | None = None,
+    ) -> List[Dict[str, Any]]:
+        """Run the solution once per element of ``cases`` in one sandbox.
+
+        See :meth:`DockerTaskRunner.run_batch`.
+        """
+        if not cases:
+            return []
+        if dir_path is None:
+            if code is None:
+                raise ValueError("code must be provided when dir_path is None")
+            with tempfile.TemporaryDirectory() as tmpdir:
+                Path(tmpdir, "main.py").write_text(code)
+                return await self._execute_batch(tmpdir, "main.py", cases, timeout, limits, expected)
+
+        workdir = Path(dir_path)
+        if not workdir.is_dir():
+            raise FileNotFoundError(f"Directory not found: {workdir}")
+        return await self._execute_batch(str(workdir), entry, cases, timeout, limits, expected)
+
+    async def _execute_batch(self, workdir: str, entry: str, cases: list[list[str]], timeout: int,
+                             limits: list[Limits | None] | None,
+                             expected: list | None = None) -> List[Dict[str, Any]]:
+        with staged_harness(workdir, entry, cases, timeout, limits, self.file_size_limit,
+                            expected) as (argv, specs, batch_timeout):
+            res = await self._execute(workdir, argv, batch_timeout, report_limit(len(specs)))
+        return harness_results(res, specs, workdir)
+
+    async def _execute(self, workdir: str, argv: list[str], timeout: float,
+                       max_output: int) -> Dict[str, Any]:
+        """Run ``python *argv`` in a sandbox, keeping at most ``max_output`` bytes of output."""
+        await self.ready()
+        async with self._slots, _host_slot():
+            if self.use_docker:
+                return await self._execute_docker(workdir, argv, timeout, max_output)
+            return await self._execute_local(workdir, argv, timeout, max_output)
+
+    async def _execute_docker(self, workdir: str, argv: list[str], timeout: float,
+                              max_output: int) -> Dict[str, Any]:
+        share_with_sandbox(workdir)
+        name = f"pygrader-{uuid.uuid4().hex[:12]}"
+        proc = await asyncio.create_subprocess_exec(
+            "docker", "run", "--rm", "--name", name,
+            "--network", "none",
+            "--memory", str(self.mem_limit),
+            "--cpus", str(self.cpu_limit),
+            "--pids-limit", str(self.pids_limit),
+            "--user", SANDBOX_USER,
+            "--read-only",
+            "--cap-drop", "ALL",
+            "--security-opt", "no-new-privileges",
+            "--tmpfs", f"/tmp:{SCRATCH_TMPFS['/tmp']}",
+            "-v", f"{workdir}:/code:ro",
+            "-w", "/code",
+            self.image, "python", *argv,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+
+        async def stop() -> None:
+            # killing the CLI would leave the container running
+            killer = await asyncio.create_subprocess_exec(
+                "docker", "kill", name,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            await killer.wait()
+
+        return await self._communicate(proc, timeout, stop, max_output)
+
+    async def _execute_local(self, workdir: str, argv: list[str], timeout: float,
+                             max_output: int) -> Dict[str, Any]:
+        # the harness applies the file size budget to every case itself
+        with self.local.session(timeout, limit_files=False) as (confine, start, kill):
+            proc = await asyncio.create_subprocess_exec(
+                "python", *argv,
+                cwd=workdir,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                **confine,
+            )
+            start(proc.pid)
+            if proc.stdin is not None:
+                proc.stdin.close()
+
+            async def stop() -> None:
+                # asyncio reaps the harness itself; after that its pid may be reused
+                kill(proc.pid, reaped=proc.returncode is not None)
+
+            try:
+                return await self._communicate(proc, timeout, stop, max_output)
+            finally:
+                # background children of the solution must not outlive the run
+                kill(proc.pid, reaped=proc.returncode is not None)
+
+    @staticmethod
+    async def _communicate(proc: asyncio.subprocess.Process, timeout: float,
+                           stop: Callable[[], Awaitable[None]], max_output: int) -> Dict[str, Any]:
+        """Collect the output of ``proc``; ``stop`` it at the deadline or on cancellation.
+
+        Output beyond ``max_output`` bytes is read but dropped.
+        """
+        start = time.perf_counter()
+        output = bytearray()
+
+        async def pump() -> None:
+            while chunk := await proc.stdout.read(1 << 16):
+                output.extend(chunk[:max(0, max_output + 1 - len(output))])
+            await proc.wait()
+
+        timed_out = False
+        try:
+            await asyncio.wait_for(pump(), timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            await stop()
+            try:
+                await asyncio.wait_for(pump(), GRACE)
+            except asyncio.TimeoutError:
+                log.warning("Sandbox process %d did not stop after its deadline", proc.pid)
+                proc.kill()
+                await proc.wait()
+        except asyncio.CancelledError:
+            await stop()
+            raise
+        text, truncated = cap_output(bytes(output), max_output)
+        return {
+            "status": proc.returncode,
+            "output": text,
+            "truncated": truncated,
+            "elapsed": time.perf_counter() - start,
+            "timed_out": timed_out,
+            "stats": None,
+        }
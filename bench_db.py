@@ -0,0 +1,119 @@
+"""Benchmark ``Database`` read methods on a large synthetic database.
+
+Seeds an encrypted database with many tasks, test cases, users and
+assignments, then times every read method twice: without the secondary
+indexes of :data:`database.LOOKUP_INDEXES` and with them::
+
+    python bench_db.py --tasks 500 --tests-per-task 40 --users 300
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from database import LOOKUP_INDEXES, Database
+
+
+def seed(db: Database, tasks: int, tests_per_task: int, users: int, per_user: int) -> None:
+    """Fill ``db`` with synthetic rows (cheap ciphertexts, one transaction)."""
+    enc = db._enc
+    db._write(lambda cur: _insert_rows(cur, enc, tasks, tests_per_task, users, per_user))
+
+
+def _insert_rows(cur, enc, tasks: int, tests_per_task: int, users: int, per_user: int) -> None:
+    cur.executemany(
+        "INSERT INTO User(name, hashed_password, is_admin) VALUES (?,?,?);",
+        [(f"user{i}", enc(f"hash{i}"), False) for i in range(users)],
+    )
+    cur.executemany(
+        "INSERT INTO Task(title, description, expiration_date, validation_rules) VALUES (?,?,?,?);",
+        [(enc(f"Task {i}"), enc("Description " * 20), enc("2030-01-01"), enc("rules"))
+         for i in range(tasks)],
+    )
+    # a cheap ciphertext is enough for test payloads that are only scanned
+    case, ans = enc("1 2 3"), enc("6")
+    cur.executemany(
+        "INSERT INTO TestCase(input_data, expected_output, task_id) VALUES (?,?,?);",
+        [(case, ans, t) for t in range(1, tasks + 1) for _ in range(tests_per_task)],
+    )
+    rnd = random.Random(0)
+    cur.executemany(
+        "INSERT OR IGNORE INTO UserTask(user_id, task_id, passed_tests) VALUES (?,?,?);",
+        [(u, t, rnd.randint(0, tests_per_task))
+         for u in range(1, users + 1)
+         for t in rnd.sample(range(1, tasks + 1), min(per_user, tasks))],
+    )
+
+
+def read_methods(db: Database, tasks: int, users: int) -> dict:
+    rnd = random.Random(1)
+
+    def task_id():
+        return rnd.randint(1, tasks)
+
+    def user_id():
+        return rnd.randint(1, users)
+
+    return {
+        "get_tasks": lambda: list(db.get_tasks()),
+        "get_users": lambda: list(db.get_users()),
+        "get_tasks_for_user": lambda: list(db.get_tasks_for_user(user_id())),
+        "get_tasks_for_user_with_counts": lambda: list(db.get_tasks_for_user_with_counts(user_id())),
+        "get_test_cases": lambda: list(db.get_test_cases(task_id())),
+        "count_tests": lambda: db.count_tests(task_id()),
+        "get_task_progress": lambda: db.get_task_progress(user_id(), task_id()),
+        "get_password": lambda: db.get_password(user_id()),
+        "is_admin": lambda: db.is_admin(user_id()),
+    }
+
+
+def measure(methods: dict, repeat: int) -> dict:
+    """Median wall time per call in milliseconds (decryption cache warmed first)."""
+    timings = {}
+    for name, call in methods.items():
+        call()
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            call()
+            samples.append((time.perf_counter() - start) * 1000)
+        timings[name] = statistics.median(samples)
+    return timings
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=500)
+    parser.add_argument("--tests-per-task", type=int, default=40)
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--tasks-per-user", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with Database(Path(tmp) / "bench.db") as db:
+            start = time.perf_counter()
+            seed(db, args.tasks, args.tests_per_task, args.users, args.tasks_per_user)
+            print(f"seeded {args.tasks} tasks, {args.tasks * args.tests_per_task} test cases, "
+                  f"{args.users} users in {time.perf_counter() - start:.1f}s")
+            methods = read_methods(db, args.tasks, args.users)
+
+            for name in LOOKUP_INDEXES:
+                db._write(lambda cur, name=name: cur.execute(f"DROP INDEX IF EXISTS {name};"))
+            before = measure(methods, args.repeat)
+            for ddl in LOOKUP_INDEXES.values():
+                db._write(lambda cur, ddl=ddl: cur.execute(ddl))
+            after = measure(methods, args.repeat)
+
+    print(f"{'method':<32}{'no index ms':>14}{'indexed ms':>14}{'speed-up':>10}")
+    for name in methods:
+        b, a = before[name], after[name]
+        print(f"{name:<32}{b:>14.3f}{a:>14.3f}{b / a if a else float('inf'):>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
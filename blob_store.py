@@ -0,0 +1,196 @@
+import base64
+import codecs
+import hashlib
+import hmac
+import os
+import struct
+import tempfile
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+from logger import log
+
+# file layout: MAGIC, plaintext size (u64), then frames of
+# (u32 length, raw Fernet token of one zlib-compressed chunk)
+MAGIC = b"PGB1"
+_HEADER = struct.Struct(">4sQ")
+_FRAME = struct.Struct(">I")
+
+
+class BlobStore:
+    """Content-addressed, deduplicated store for large payloads on disk.
+
+    Blobs are named by a keyed SHA-256 of their plaintext, so equal payloads
+    are stored once without the names revealing anything about the content.
+    Each blob is split into ``chunk_size`` pieces that are compressed and
+    Fernet-encrypted separately, which lets :meth:`iter_chunks` decrypt a
+    blob piece by piece instead of loading it whole.
+
+    Parameters
+    ----------
+    root: Path
+        Directory holding the blobs (created on first write).
+    fernet:
+        ``cryptography.fernet.Fernet`` instance used for encryption.
+    digest_key: bytes
+        Secret key of the content digest.
+    chunk_size: int
+        Plaintext bytes per encrypted frame.
+    """
+
+    def __init__(self, root: str | Path, fernet, digest_key: bytes, *, chunk_size: int = 1 << 20):
+        self.root = Path(root)
+        self.fernet = fernet
+        self.digest_key = digest_key
+        self.chunk_size = chunk_size
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:]
+
+    def digest(self, data: bytes) -> str:
+        return hmac.new(self.digest_key, data, hashlib.sha256).hexdigest()
+
+    def exists(self, digest: str) -> bool:
+        return self._path(digest).is_file()
+
+    def put(self, data: bytes | str) -> str:
+        """Store ``data`` (UTF-8 encoded if ``str``) and return its digest."""
+        if isinstance(data, str):
+            data = data.encode()
+        digest = self.digest(data)
+        if self.exists(digest):
+            return digest
+        with self._writer() as (fh, write_frame, commit):
+            fh.write(_HEADER.pack(MAGIC, len(data)))
+            for start in range(0, len(data), self.chunk_size):
+                write_frame(data[start:start + self.chunk_size])
+            commit(digest)
+        return digest
+
+    def put_stream(self, stream: BinaryIO) -> str:
+        """Store everything read from ``stream`` without holding it in memory."""
+        mac = hmac.new(self.digest_key, digestmod=hashlib.sha256)
+        size = 0
+        with self._writer() as (fh, write_frame, commit):
+            fh.write(_HEADER.pack(MAGIC, 0))
+            for chunk in iter(lambda: stream.read(self.chunk_size), b""):
+                mac.update(chunk)
+                size += len(chunk)
+                write_frame(chunk)
+            fh.seek(0)
+            fh.write(_HEADER.pack(MAGIC, size))
+            digest = mac.hexdigest()
+            if not self.exists(digest):
+                commit(digest)
+        return digest
+
+    @contextmanager
+    def _writer(self):
+        """Yield a temporary file in the store, a frame writer and ``commit(digest)``.
+
+        ``commit`` moves the finished file into place; uncommitted files are removed.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, name = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        fh = os.fdopen(fd, "w+b")
+
+        def write_frame(chunk: bytes) -> None:
+            # store the raw token bytes, not Fernet's base64 text
+            token = base64.urlsafe_b64decode(self.fernet.encrypt(zlib.compress(chunk)))
+            fh.write(_FRAME.pack(len(token)))
+            fh.write(token)
+
+        def commit(digest: str) -> None:
+            fh.flush()
+            os.fsync(fh.fileno())
+            path = self._path(digest)
+            path.parent.mkdir(exist_ok=True)
+            os.replace(name, path)
+
+        try:
+            yield fh, write_frame, commit
+        finally:
+            fh.close()
+            if os.path.exists(name):  # not committed
+                os.unlink(name)
+
+    def size(self, digest: str) -> int:
+        """Plaintext size of a blob in bytes."""
+        with self._path(digest).open("rb") as fh:
+            return self._read_header(fh, digest)
+
+    @staticmethod
+    def _read_header(fh, digest: str) -> int:
+        magic, size = _HEADER.unpack(fh.read(_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"Blob {digest} is corrupt")
+        return size
+
+    def iter_chunks(self, digest: str) -> Iterator[bytes]:
+        """Yield the decrypted plaintext of a blob chunk by chunk."""
+        with self._path(digest).open("rb") as fh:
+            self._read_header(fh, digest)
+            while header := fh.read(_FRAME.size):
+                (length,) = _FRAME.unpack(header)
+                token = base64.urlsafe_b64encode(fh.read(length))
+                yield zlib.decompress(self.fernet.decrypt(token))
+
+    def read(self, digest: str) -> bytes:
+        return b"".join(self.iter_chunks(digest))
+
+    def delete(self, digest: str) -> None:
+        self._path(digest).unlink(missing_ok=True)
+
+    def collect_garbage(self, referenced: set[str]) -> int:
+        """Delete every blob whose digest is not in ``referenced``."""
+        removed = 0
+        if not self.root.is_dir():
+            return removed
+        for path in self.root.glob("??/*"):
+            if path.parent.name + path.name not in referenced:
+                path.unlink()
+                removed += 1
+        log.info("Removed %d unreferenced blobs from %s", removed, self.root)
+        return removed
+
+
+class BlobRef:
+    """Lazy handle to a text payload in a :class:`BlobStore`.
+
+    Nothing is read until :meth:`chunks` or :meth:`text` (or ``str()``) is
+    called; :meth:`chunks` streams the payload without loading it whole.
+    """
+
+    __slots__ = ("store", "digest")
+
+    def __init__(self, store: BlobStore, digest: str):
+        self.store = store
+        self.digest = digest
+
+    @property
+    def size(self) -> int:
+        """Payload size in bytes."""
+        return self.store.size(self.digest)
+
+    def chunks(self) -> Iterator[str]:
+        """Yield the payload as text pieces (multi-byte characters are never split)."""
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        for chunk in self.store.iter_chunks(self.digest):
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+    def text(self) -> str:
+        return self.store.read(self.digest).decode()
+
+    def __str__(self) -> str:
+        return self.text()
+
+    def __repr__(self) -> str:
+        return f"BlobRef({self.digest[:12]}…)"
+
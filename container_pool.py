@@ -0,0 +1,341 @@
+import atexit
+import io
+import os
+import stat
+import socket
+import tarfile
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Dict, Any, Callable
+
+from logger import log
+from run_watchdog import GRACE, Watchdog, read_bounded
+from sandbox_harness import MAX_OUTPUT, cap_output
+
+# unprivileged user (nobody) every sandbox container runs as
+SANDBOX_USER = "65534:65534"
+# ``containers.run`` options shared by pooled and one-shot containers: no
+# capabilities, no privilege gain and a read-only root file system, so a run
+# can only write to the tmpfs mounts below
+HARDENING = {
+    "user": SANDBOX_USER,
+    "read_only": True,
+    "cap_drop": ["ALL"],
+    "security_opt": ["no-new-privileges"],
+}
+# writable scratch space of a sandbox; ``/code`` receives the staged solution
+SCRATCH_TMPFS = {
+    "/code": "rw,nosuid,nodev,size=256m,mode=1777",
+    "/tmp": "rw,nosuid,nodev,size=64m,mode=1777",
+}
+# wipes everything a run may have left behind in a pooled container
+_RESET = "kill -9 -1 2>/dev/null; find /code /tmp /dev/shm -mindepth 1 -delete"
+
+
+def share_with_sandbox(root: str) -> None:
+    """Make the staged tree at ``root`` readable by :data:`SANDBOX_USER`.
+
+    One-shot containers bind-mount the host directory as ``/code``, which
+    keeps its host modes; ``tempfile`` creates it 0700 for the grader's user,
+    so ``nobody`` could not even open the harness. Read (and directory
+    search) bits are only added, never removed; symlinks are left alone.
+    """
+    for dirpath, _, filenames in os.walk(root):
+        os.chmod(dirpath, stat.S_IMODE(os.lstat(dirpath).st_mode) | 0o755)
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            mode = os.lstat(path).st_mode
+            if stat.S_ISREG(mode):
+                os.chmod(path, stat.S_IMODE(mode) | 0o644)
+
+
+class _PooledContainer:
+    """Bookkeeping for a single warm container."""
+
+    __slots__ = ("container", "created", "last_used", "uses")
+
+    def __init__(self, container):
+        self.container = container
+        self.created = self.last_used = time.monotonic()
+        self.uses = 0
+
+
+class ContainerPool:
+    """Pool of pre-started, network-less containers for one image/limit combo.
+
+    Containers are started with an idle ``sleep infinity`` command and the
+    same resource limits and :data:`HARDENING` as the one-shot path of
+    :class:`DockerTaskRunner`: they run as :data:`SANDBOX_USER` without
+    capabilities on a read-only root file system, so the only writable places
+    are the tmpfs mounts of :data:`SCRATCH_TMPFS` and ``/dev/shm``. A run
+    streams the solution into a fresh directory under ``/code``, executes it
+    with ``docker exec`` and afterwards resets the container (kills every
+    process of the sandbox user and empties all writable directories) before
+    handing it back to the pool, so nothing of one submission is visible to
+    the next.
+
+    Parameters
+    ----------
+    client:
+        ``docker.DockerClient`` used to manage the containers.
+    image: str
+        Image the containers are started from.
+    size: int
+        Number of idle containers kept warm.
+    idle_timeout: float
+        Seconds an idle container may sit in the pool before it is evicted.
+    max_uses: int
+        Containers are retired after this many runs even if they look healthy.
+    """
+
+    def __init__(self,
+                 client,
+                 image: str,
+                 *,
+                 cpu_limit: float = 0.5,
+                 mem_limit: str = "512m",
+                 pids_limit: int = 64,
+                 size: int = 2,
+                 idle_timeout: float = 300.0,
+                 max_uses: int = 50):
+        self.client = client
+        self.image = image
+        self.cpu_limit = cpu_limit
+        self.mem_limit = mem_limit
+        self.pids_limit = pids_limit
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.max_uses = max_uses
+        self._idle: list[_PooledContainer] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    # ------------------------------------------------------------------ #
+    # container lifecycle
+    # ------------------------------------------------------------------ #
+    def _start(self) -> _PooledContainer:
+        container = self.client.containers.run(
+            self.image,
+            command=["sleep", "infinity"],
+            network_mode="none",
+            detach=True,
+            working_dir="/code",
+            mem_limit=self.mem_limit,
+            cpu_period=100000,
+            cpu_quota=int(self.cpu_limit * 100000),
+            pids_limit=self.pids_limit,
+            tmpfs=SCRATCH_TMPFS,
+            labels={"pygrader.pool": self.image},
+            **HARDENING,
+        )
+        return _PooledContainer(container)
+
+    @staticmethod
+    def _discard(pc: _PooledContainer) -> None:
+        try:
+            pc.container.remove(force=True)
+        except Exception as exc:  # container may already be gone
+            log.debug("Failed to remove pooled container: %s", exc)
+
+    def _is_healthy(self, pc: _PooledContainer) -> bool:
+        try:
+            pc.container.reload()
+        except Exception:
+            return False
+        return pc.container.status == "running"
+
+    def warm(self) -> None:
+        """Start containers until ``size`` idle ones are available."""
+        while True:
+            with self._lock:
+                if self._closed or len(self._idle) >= self.size:
+                    return
+            try:
+                pc = self._start()
+            except Exception as exc:
+                log.warning("Could not pre-start container for %s: %s", self.image, exc)
+                return
+            with self._lock:
+                if self._closed:
+                    self._discard(pc)
+                    return
+                self._idle.append(pc)
+
+    def evict_idle(self) -> int:
+        """Remove containers idle for longer than ``idle_timeout``."""
+        now = time.monotonic()
+        with self._lock:
+            stale = [pc for pc in self._idle if now - pc.last_used > self.idle_timeout]
+            self._idle = [pc for pc in self._idle if pc not in stale]
+        for pc in stale:
+            self._discard(pc)
+        return len(stale)
+
+    def acquire(self) -> _PooledContainer:
+        """Hand out a healthy warm container, starting a new one if needed."""
+        self.evict_idle()
+        while True:
+            with self._lock:
+                pc = self._idle.pop() if self._idle else None
+            if pc is None:
+                return self._start()
+            if self._is_healthy(pc):
+                return pc
+            self._discard(pc)
+
+    def release(self, pc: _PooledContainer, *, reusable: bool = True) -> None:
+        """Return ``pc`` to the pool or retire it."""
+        pc.uses += 1
+        pc.last_used = time.monotonic()
+        with self._lock:
+            keep = (
+                reusable
+                and not self._closed
+                and pc.uses < self.max_uses
+                and len(self._idle) < self.size
+            )
+            if keep:
+                self._idle.append(pc)
+        if not keep:
+            self._discard(pc)
+
+    def close(self) -> None:
+        """Remove every idle container and refuse to keep new ones."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for pc in idle:
+            self._discard(pc)
+
+    # ------------------------------------------------------------------ #
+    # execution
+    # ------------------------------------------------------------------ #
+    @staticmethod
+    def _pack(workdir: str, arcname: str) -> bytes:
+        buf = io.BytesIO()
+        with tarfile.open(fileobj=buf, mode="w") as tar:
+            tar.add(str(Path(workdir)), arcname=arcname)
+        return buf.getvalue()
+
+    def _exit_code(self, exec_id: str) -> int | None:
+        """Exit code of an exec whose output stream has closed.
+
+        The daemon may still report the exec as running (and ``ExitCode`` as
+        ``None``) for a moment after the stream ends, so poll briefly.
+        """
+        for _ in range(100):
+            state = self.client.api.exec_inspect(exec_id)
+            if not state.get("Running"):
+                break
+            time.sleep(0.01)
+        return state.get("ExitCode")
+
+    def _upload(self, pc: _PooledContainer, archive: bytes) -> None:
+        """Unpack ``archive`` into ``/code`` by piping it into ``tar`` in the container.
+
+        ``put_archive`` cannot be used: the daemon refuses it on a read-only
+        root file system and it does not write into tmpfs mounts.
+        """
+        api = self.client.api
+        exec_id = api.exec_create(pc.container.id, ["tar", "-x", "-C", "/code"],
+                                  stdin=True, stdout=True, stderr=True)["Id"]
+        sock = api.exec_start(exec_id, socket=True)
+        raw = getattr(sock, "_sock", sock)
+        try:
+            raw.sendall(archive)
+            raw.shutdown(socket.SHUT_WR)
+            while raw.recv(1 << 16):  # tar's messages; EOF once it exits
+                pass
+        finally:
+            sock.close()
+        if self._exit_code(exec_id) != 0:
+            raise RuntimeError(f"Could not copy the solution into container {pc.container.id}")
+
+    def run(self, workdir: str, entry: str, args: list[str], timeout: int,
+            track: Callable | None = None, max_output: int | None = MAX_OUTPUT) -> Dict[str, Any]:
+        """Execute ``entry`` from ``workdir`` inside a pooled container.
+
+        ``track`` is an optional context manager factory called with the
+        container while the solution runs (used for cancellation); a container
+        that was killed fails its reset and is discarded. At most
+        ``max_output`` bytes of output are kept (``None``: all of it).
+
+        A :class:`run_watchdog.Watchdog` kills the solution's processes at the
+        deadline (and the whole container if that does not end the run); the
+        output produced until then is returned with ``timed_out`` set.
+        """
+        pc = self.acquire()
+        run_id = uuid.uuid4().hex
+        run_dir = f"/code/{run_id}"
+        reusable = False
+        api = self.client.api
+        try:
+            self._upload(pc, self._pack(workdir, run_id))
+            exec_id = api.exec_create(
+                pc.container.id,
+                # in-container backstop in case the host cannot reach the daemon
+                ["timeout", "-s", "KILL", str(timeout + GRACE), "python", entry, *args],
+                workdir=run_dir,
+                stdout=True,
+                stderr=True,
+            )["Id"]
+            dog = Watchdog(
+                timeout,
+                # slim images have no kill binary, only the shell builtin
+                lambda: pc.container.exec_run(["sh", "-c", "kill -9 -1"]),
+                escalate=pc.container.kill,
+            )
+            with track(pc.container) if track else nullcontext(), dog:
+                output, dropped = read_bounded(
+                    api.exec_start(exec_id, stream=True),
+                    None if max_output is None else max_output + 1,
+                )
+            exit_code = self._exit_code(exec_id)
+            # reset: kill anything the solution left behind and drop every file it wrote
+            reset_code, _ = pc.container.exec_run(["sh", "-c", _RESET])
+            reusable = reset_code == 0
+        finally:
+            self.release(pc, reusable=reusable)
+
+        text, truncated = cap_output(output, max_output)
+        return {
+            "status": exit_code,
+            "output": text,
+            "truncated": truncated or dropped,
+            "elapsed": dog.elapsed,
+            "timed_out": dog.fired,
+            "stats": None,
+        }
+
+
+_POOLS: dict[tuple, ContainerPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(client, image: str, **options) -> ContainerPool:
+    """Return the process-wide pool for ``image`` and ``options``.
+
+    Pools are shared between runner instances so that containers stay warm
+    across consecutive grading calls. A new pool is warmed in the background.
+    """
+    key = (image, *sorted(options.items()))
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = ContainerPool(client, image, **options)
+            _POOLS[key] = pool
+            threading.Thread(target=pool.warm, daemon=True).start()
+    return pool
+
+
+@atexit.register
+def close_all_pools() -> None:
+    """Remove every pooled container (called automatically at exit)."""
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.close()
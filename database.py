@@ -1,25 +1,160 @@
+import hashlib
+import hmac
+import logging
+import os
+import queue
 import sqlite3 as sql
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Iterable, NamedTuple, Optional
 
+from blob_store import BlobRef, BlobStore
+from limits import Limits
 from logger import log
+from task_row import TaskRow
+
+# Secondary indexes for the hot lookups (also used by bench_db.py)
+LOOKUP_INDEXES = {
+    # get_test_cases / count_tests and ON DELETE CASCADE from Task
+    "idx_testcase_task": "CREATE INDEX IF NOT EXISTS idx_testcase_task ON TestCase(task_id);",
+    # "who has this task" and foreign key checks when a Task is deleted
+    "idx_usertask_task": "CREATE INDEX IF NOT EXISTS idx_usertask_task ON UserTask(task_id, user_id);",
+    # prune_result_cache orders by age
+    "idx_resultcache_created": "CREATE INDEX IF NOT EXISTS idx_resultcache_created ON ResultCache(created_at);",
+}
+
+# PRAGMAs applied by ``Database.open`` for each connection profile. "performance"
+# lets grading workers write while the GUI reads (WAL: many readers, one writer).
+PRAGMA_PROFILES = {
+    "default": (),
+    "performance": (
+        "PRAGMA journal_mode = WAL;",
+        "PRAGMA synchronous = NORMAL;",   # durable at checkpoints, safe with WAL
+        "PRAGMA cache_size = -16384;",    # 16 MiB page cache
+        "PRAGMA mmap_size = 67108864;",   # 64 MiB memory-mapped reads
+        "PRAGMA temp_store = MEMORY;",
+    ),
+}
+
+
+class Submission(NamedTuple):
+    """One graded attempt as returned by the submission queries."""
+
+    submission_id: int
+    user_id: int
+    task_id: int
+    code_hash: str
+    backend: str                # runner backend: "docker", "local" or "zygote"
+    passed_tests: int
+    total_tests: int
+    runtime_ms: float | None
+    submitted_at: str
+    environment: str | None = None  # runner fingerprint, see find_submission
+
+
+_INSERT_TEST_CASE = """INSERT INTO TestCase(input_data, input_digest, expected_output, expected_digest,
+                                             time_limit, cpu_limit, memory_limit_kb, task_id)
+                       VALUES (?,?,?,?,?,?,?,?);"""
+
+_SUBMISSION_COLUMNS = (
+    "submission_id, user_id, task_id, code_hash, backend, "
+    "passed_tests, total_tests, runtime_ms, submitted_at, environment"
+)
+
+
+class _ReaderSlot:
+    """Holds a thread's read connection; closing it is tied to the slot's lifetime."""
+
+    __slots__ = ("conn", "__weakref__")
+
+    def __init__(self, conn: sql.Connection):
+        self.conn = conn
+
+
+def _drop_reader(lock: threading.Lock, readers: list, conn: sql.Connection) -> None:
+    """Close a read connection whose thread has exited and forget it."""
+    with lock:
+        try:
+            readers.remove(conn)
+        except ValueError:
+            pass  # already handed to close()
+    conn.close()
 
 
 class Database:
-    """Same API as original code, but with micro-optimisations and type hints."""
+    """Same API as original code, but with micro-optimisations and type hints.
+
+    Safe to share between threads: every thread reads through its own
+    connection with a fresh cursor per call, while all writes are queued to a
+    single writer thread that owns the only write connection and runs each
+    call in its own transaction. ``db_path`` must be a file (``:memory:``
+    would give every connection its own database).
+    """
 
-    def __init__(self, db_path: str | Path = "database.db", encryption_key: Optional[bytes] = None):
+    # number of decrypted column values kept in memory
+    DECRYPT_CACHE_SIZE = 4096
+
+    # Ordered schema migrations, applied once by ``open()``. ``PRAGMA
+    # user_version`` stores how many have run. Steps must stay idempotent:
+    # databases from before versioning start at 0 with tables already present.
+    MIGRATIONS = (
+        "_migration_base_tables",
+        "_migration_passed_tests",
+        "_migration_result_cache",
+        "_migration_lookup_indexes",
+        "_migration_task_blind_index",
+        "_migration_submissions",
+        "_migration_testcase_blobs",
+        "_migration_budgets",
+        "_migration_submission_environment",
+    )
+
+    # test payloads of at least this many bytes are kept in the blob store
+    BLOB_THRESHOLD = 64 * 1024
+
+    def __init__(self,
+                 db_path: str | Path = "database.db",
+                 encryption_key: Optional[bytes] = None,
+                 *,
+                 profile: str | None = None,
+                 busy_timeout: float = 5.0,
+                 blob_dir: str | Path | None = None):
         from cryptography.fernet import Fernet  # lazy import to fail gracefully if absent
 
         self.path = Path(db_path)
-        self._conn: Optional[sql.Connection] = None
-        self._cursor: Optional[sql.Cursor] = None
+        self.profile = profile or os.environ.get("PYGRADER_DB_PROFILE", "default")
+        if self.profile not in PRAGMA_PROFILES:
+            raise ValueError(f"Unknown database profile: {self.profile!r}")
+        # seconds a statement waits for another connection's lock before "database is locked"
+        self.busy_timeout = busy_timeout
+        # one read connection per thread, all writes go through the writer thread
+        self._local = threading.local()
+        self._readers: list[sql.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._writes: queue.SimpleQueue = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+        self._dec_cache: OrderedDict[tuple, str] = OrderedDict()
+        self._dec_lock = threading.Lock()
+        self.dec_cache_hits = 0
+        self.dec_cache_misses = 0
 
         if encryption_key is None:
             log.warning("No encryption key supplied – generating volatile session key.")
             encryption_key = Fernet.generate_key()
         self.fernet = Fernet(encryption_key)
+        # separate key for blind indexes so they reveal nothing about the Fernet key
+        self._bidx_key = hmac.new(encryption_key, b"pygrader blind index", hashlib.sha256).digest()
+        # large test inputs / expected outputs live next to the database file
+        self.blobs = BlobStore(
+            blob_dir if blob_dir is not None else self.path.with_name(self.path.name + ".blobs"),
+            self.fernet,
+            hmac.new(encryption_key, b"pygrader blob digest", hashlib.sha256).digest(),
+        )
 
     def _enc(self, txt: str | None) -> str | None:
         return self.fernet.encrypt(txt.encode()).decode() if txt is not None else None
@@ -27,120 +162,450 @@ class Database:
     def _dec(self, txt: str | None) -> str | None:
         return self.fernet.decrypt(txt.encode()).decode() if txt is not None else None
 
+    def _bidx(self, txt: str | None) -> str | None:
+        """Keyed-HMAC blind index of ``txt`` for equality lookups on encrypted columns.
+
+        Values are compared after ``strip()``/``casefold()``.
+        """
+        if txt is None:
+            return None
+        return hmac.new(self._bidx_key, txt.strip().casefold().encode(), hashlib.sha256).hexdigest()
+
+    def _test_payload(self, txt: str) -> tuple[str, str | None]:
+        """Return ``(inline ciphertext, blob digest)`` for a test input or expected output."""
+        if len(txt.encode()) >= self.BLOB_THRESHOLD:
+            return "", self.blobs.put(txt)
+        return self._enc(txt), None
+
+    def _test_row(self, test: tuple) -> tuple:
+        """Columns of an ``(input, expected[, limits])`` test case, without task_id."""
+        limits = test[2] if len(test) > 2 and test[2] is not None else Limits()
+        return (*self._test_payload(test[0]), *self._test_payload(test[1]), *limits)
+
+    def _test_value(self, test_id: int, column: str, txt: str, digest: str | None, lazy: bool):
+        if digest is None:
+            return self._dec_cached("TestCase", test_id, column, txt)
+        ref = BlobRef(self.blobs, digest)
+        return ref if lazy else ref.text()
+
+    def _dec_cached(self, table: str, rowid: int, column: str, txt: str | None) -> str | None:
+        """Decrypt ``txt`` once per (table, rowid, column, ciphertext digest)."""
+        if txt is None:
+            return None
+        key = (table, rowid, column, hashlib.blake2b(txt.encode(), digest_size=16).digest())
+        with self._dec_lock:
+            value = self._dec_cache.get(key)
+            if value is not None:
+                self._dec_cache.move_to_end(key)
+                self.dec_cache_hits += 1
+                return value
+            self.dec_cache_misses += 1
+        value = self._dec(txt)
+        with self._dec_lock:
+            self._dec_cache[key] = value
+            if len(self._dec_cache) > self.DECRYPT_CACHE_SIZE:
+                self._dec_cache.popitem(last=False)
+        return value
+
+    def _invalidate(self, table: str, rowid: int | None = None) -> None:
+        """Drop cached plaintext of ``table`` (only of ``rowid`` if given)."""
+        with self._dec_lock:
+            stale = [k for k in self._dec_cache if k[0] == table and (rowid is None or k[1] == rowid)]
+            for k in stale:
+                del self._dec_cache[k]
+
+    @staticmethod
+    def _log_bulk(what: str, rows: int, start: float) -> None:
+        elapsed = time.perf_counter() - start
+        rate = rows / elapsed if elapsed else float("inf")
+        # single-row calls (add_task) stay quiet
+        level = logging.INFO if rows > 1 else logging.DEBUG
+        log.log(level, "Inserted %d %s in %.3fs (%.0f rows/s)", rows, what, elapsed, rate)
+
+    def decrypt_cache_stats(self) -> dict:
+        """Return hit/miss counters and the current size of the decryption cache."""
+        with self._dec_lock:
+            return {
+                "hits": self.dec_cache_hits,
+                "misses": self.dec_cache_misses,
+                "size": len(self._dec_cache),
+            }
+
     def __enter__(self):
         self.open()
-        self._create_tables()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
         return False
 
+    # ------------------------------------------------------------------ #
+    # connections
+    # ------------------------------------------------------------------ #
+    def _connect(self, *, writer: bool = False) -> sql.Connection:
+        # connections stay on their own thread; close() may reach across threads
+        conn = sql.connect(self.path, timeout=self.busy_timeout, check_same_thread=False)
+        conn.execute("PRAGMA foreign_keys = ON;")
+        for pragma in PRAGMA_PROFILES[self.profile]:
+            if pragma.startswith("PRAGMA journal_mode"):
+                if not writer:
+                    continue  # persistent, set once by the writer
+                row = conn.execute(pragma).fetchone()
+                # reports the mode actually in use (":memory:" stays "memory")
+                if row and row[0].lower() != "wal":
+                    log.warning("WAL not available for %s, journal mode is %s", self.path, row[0])
+            else:
+                conn.execute(pragma)
+        return conn
+
     def open(self):
-        self._conn = sql.connect(self.path)
-        self._cursor = self._conn.cursor()
-        self._cursor.execute("PRAGMA foreign_keys = ON;")
-        log.info("Opened DB at %s", self.path)
+        """Start the writer thread and bring the schema up to date."""
+        if self._writer is not None:
+            return
+        self._writes = queue.SimpleQueue()
+        ready: Future = Future()
+        self._writer = threading.Thread(
+            target=self._writer_loop, args=(ready,), name="pygrader-db-writer", daemon=True
+        )
+        self._writer.start()
+        try:
+            ready.result()
+        except Exception:
+            self._writer.join()
+            self._writer = None
+            raise
+        log.info("Opened DB at %s (%s profile)", self.path, self.profile)
 
     def close(self):
-        if self._cursor:
-            self._cursor.close()
-        if self._conn:
-            self._conn.close()
-        self._cursor = self._conn = None
+        """Flush queued writes, stop the writer and close every connection."""
+        if self._writer is not None:
+            self._writes.put(None)
+            self._writer.join()
+            self._writer = None
+        with self._readers_lock:
+            readers, self._readers = self._readers, []
+            local, self._local = self._local, threading.local()
+        for conn in readers:
+            conn.close()
+        # dropping the old thread-local fires the slot finalizers, which take the lock
+        del local
         log.info("Closed DB")
 
+    def _reader(self) -> sql.Connection:
+        """Return this thread's read connection, opening it on first use.
+
+        The connection sits in a slot in thread-local storage, which Python frees
+        when the thread exits; the slot's finalizer then closes the connection so
+        short-lived worker threads do not leave file handles behind.
+        """
+        slot = getattr(self._local, "slot", None)
+        if slot is None:
+            if self._writer is None:
+                raise sql.ProgrammingError("Database is not open")
+            conn = self._connect()
+            slot = _ReaderSlot(conn)
+            with self._readers_lock:
+                self._readers.append(conn)
+                self._local.slot = slot
+            # the finalizer must not reference self, or the Database could never be collected
+            weakref.finalize(slot, _drop_reader, self._readers_lock, self._readers, conn)
+        return slot.conn
+
     @contextmanager
-    def _tx(self):
+    def _read(self):
+        """Yield a fresh cursor on the calling thread's read connection."""
+        cur = self._reader().cursor()
         try:
-            yield
-            self._conn.commit()
-        except Exception:
-            self._conn.rollback()
-            raise
+            yield cur
+        finally:
+            cur.close()
 
-    def _create_tables(self):
-        with self._tx():
-            cur = self._cursor
-            cur.execute(
-                    """CREATE TABLE IF NOT EXISTS User (
-                        user_id INTEGER PRIMARY KEY,
-                        name TEXT NOT NULL UNIQUE,
-                        hashed_password TEXT NOT NULL,
-                        is_admin BOOLEAN NOT NULL
-                    );"""
-            )
-            cur.execute(
-                    """CREATE TABLE IF NOT EXISTS Task (
-                        task_id INTEGER PRIMARY KEY,
-                        title TEXT NOT NULL,
-                        description TEXT NOT NULL,
-                        expiration_date TEXT,
-                        validation_rules TEXT NOT NULL
-                    );"""
-            )
-            cur.execute(
-                    """CREATE TABLE IF NOT EXISTS TestCase (
-                        test_id INTEGER PRIMARY KEY,
-                        input_data TEXT NOT NULL,
-                        expected_output TEXT NOT NULL,
-                        task_id INTEGER NOT NULL
-                            REFERENCES Task(task_id) ON DELETE CASCADE
-                    );"""
-            )
+    def _writer_loop(self, ready: Future) -> None:
+        try:
+            conn = self._connect(writer=True)
+            self._migrate(conn)
+        except Exception as exc:
+            ready.set_exception(exc)
+            return
+        ready.set_result(None)
+        while True:
+            job = self._writes.get()
+            if job is None:
+                break
+            func, future = job
+            cur = conn.cursor()
+            try:
+                cur.execute("BEGIN IMMEDIATE;")
+                result = func(cur)
+                conn.commit()
+            except BaseException as exc:
+                conn.rollback()
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+            finally:
+                cur.close()
+        conn.close()
+
+    def _write(self, func: Callable[[sql.Cursor], Any], *, wait: bool = True):
+        """Run ``func(cursor)`` in its own transaction on the writer thread.
+
+        Returns ``func``'s result, or immediately when ``wait`` is false (failures
+        are then only logged).
+        """
+        if self._writer is None:
+            raise sql.ProgrammingError("Database is not open")
+        future: Future = Future()
+        self._writes.put((func, future))
+        if wait:
+            return future.result()
+        future.add_done_callback(
+            lambda f: f.exception() and log.error("Queued DB write failed: %s", f.exception())
+        )
+        return None
+
+    def _migrate(self, conn: sql.Connection) -> None:
+        """Bring the schema up to date, one transaction per pending step.
+
+        ``PRAGMA user_version`` records how many entries of :attr:`MIGRATIONS`
+        have been applied, so this only inspects the schema when it is behind.
+        """
+        cur = conn.cursor()
+        version = cur.execute("PRAGMA user_version;").fetchone()[0]
+        for number, step in enumerate(self.MIGRATIONS[version:], start=version + 1):
+            cur.execute("BEGIN;")
+            try:
+                getattr(self, step)(cur)
+                cur.execute(f"PRAGMA user_version = {number:d};")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            log.info("Applied DB migration %d (%s)", number, step)
+        cur.close()
+
+    def _migration_base_tables(self, cur: sql.Cursor) -> None:
+        cur.execute(
+                """CREATE TABLE IF NOT EXISTS User (
+                    user_id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL UNIQUE,
+                    hashed_password TEXT NOT NULL,
+                    is_admin BOOLEAN NOT NULL
+                );"""
+        )
+        cur.execute(
+                """CREATE TABLE IF NOT EXISTS Task (
+                    task_id INTEGER PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    description TEXT NOT NULL,
+                    expiration_date TEXT,
+                    validation_rules TEXT NOT NULL
+                );"""
+        )
+        cur.execute(
+                """CREATE TABLE IF NOT EXISTS TestCase (
+                    test_id INTEGER PRIMARY KEY,
+                    input_data TEXT NOT NULL,
+                    expected_output TEXT NOT NULL,
+                    task_id INTEGER NOT NULL
+                        REFERENCES Task(task_id) ON DELETE CASCADE
+                );"""
+        )
+        cur.execute(
+                """CREATE TABLE IF NOT EXISTS UserTask (
+                    user_id INTEGER NOT NULL REFERENCES User(user_id),
+                    task_id INTEGER NOT NULL REFERENCES Task(task_id),
+                    passed_tests INTEGER DEFAULT 0,
+                    PRIMARY KEY (user_id, task_id)
+                );"""
+        )
+
+    def _migration_passed_tests(self, cur: sql.Cursor) -> None:
+        # databases created before the passed_tests column was added
+        cols = [row[1] for row in cur.execute("PRAGMA table_info(UserTask);")]
+        if "passed_tests" not in cols:
+            cur.execute("ALTER TABLE UserTask ADD COLUMN passed_tests INTEGER DEFAULT 0;")
+
+    def _migration_result_cache(self, cur: sql.Cursor) -> None:
+        cur.execute(
+                """CREATE TABLE IF NOT EXISTS ResultCache (
+                    cache_key TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+                );"""
+        )
+
+    def _migration_lookup_indexes(self, cur: sql.Cursor) -> None:
+        for ddl in LOOKUP_INDEXES.values():
+            cur.execute(ddl)
+
+    def _migration_task_blind_index(self, cur: sql.Cursor) -> None:
+        # User.name is stored in plaintext and already has a UNIQUE index;
+        # the encrypted Task columns get HMAC blind indexes for equality lookups.
+        cols = [row[1] for row in cur.execute("PRAGMA table_info(Task);")]
+        for col in ("title_bidx", "expiration_bidx"):
+            if col not in cols:
+                cur.execute(f"ALTER TABLE Task ADD COLUMN {col} TEXT;")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_task_title_bidx ON Task(title_bidx);")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_task_expiration_bidx ON Task(expiration_bidx);")
+        rows = cur.execute(
+            "SELECT task_id, title, expiration_date FROM Task WHERE title_bidx IS NULL;"
+        ).fetchall()
+        cur.executemany(
+            "UPDATE Task SET title_bidx=?, expiration_bidx=? WHERE task_id=?;",
+            [
+                (self._bidx(self._dec(tl)), self._bidx(self._dec(exp)) if exp else None, tid)
+                for tid, tl, exp in rows
+            ],
+        )
+
+    def _migration_submissions(self, cur: sql.Cursor) -> None:
+        # append-only history of graded attempts; UserTask.passed_tests keeps the latest score
+        cur.execute(
+                """CREATE TABLE IF NOT EXISTS Submission (
+                    submission_id INTEGER PRIMARY KEY,
+                    user_id INTEGER NOT NULL REFERENCES User(user_id),
+                    task_id INTEGER NOT NULL REFERENCES Task(task_id) ON DELETE CASCADE,
+                    code_hash TEXT NOT NULL,
+                    backend TEXT NOT NULL,
+                    passed_tests INTEGER NOT NULL,
+                    total_tests INTEGER NOT NULL,
+                    runtime_ms REAL,
+                    submitted_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+                );"""
+        )
+        cur.execute(
+                """CREATE TABLE IF NOT EXISTS SubmissionResult (
+                    submission_id INTEGER NOT NULL
+                        REFERENCES Submission(submission_id) ON DELETE CASCADE,
+                    test_index INTEGER NOT NULL,
+                    passed BOOLEAN NOT NULL,
+                    status INTEGER,
+                    timed_out BOOLEAN NOT NULL DEFAULT 0,
+                    runtime_ms REAL,
+                    memory_kb INTEGER,
+                    PRIMARY KEY (submission_id, test_index)
+                ) WITHOUT ROWID;"""
+        )
+        # latest attempt: newest submission_id; best attempt: highest score, earliest first
+        cur.execute(
+            """CREATE INDEX IF NOT EXISTS idx_submission_latest
+               ON Submission(user_id, task_id, submission_id);"""
+        )
+        cur.execute(
+            """CREATE INDEX IF NOT EXISTS idx_submission_best
+               ON Submission(user_id, task_id, passed_tests DESC, submission_id);"""
+        )
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_submission_code ON Submission(task_id, code_hash, backend);"
+        )
+
+    def _migration_testcase_blobs(self, cur: sql.Cursor) -> None:
+        # large payloads move to the blob store; the inline column is then left empty
+        cols = [row[1] for row in cur.execute("PRAGMA table_info(TestCase);")]
+        for col in ("input_digest", "expected_digest"):
+            if col not in cols:
+                cur.execute(f"ALTER TABLE TestCase ADD COLUMN {col} TEXT;")
+        # ciphertext is always longer than its plaintext, so this finds every candidate
+        rows = cur.execute(
+            """SELECT test_id, input_data, expected_output FROM TestCase
+               WHERE length(input_data) >= ? OR length(expected_output) >= ?;""",
+            (self.BLOB_THRESHOLD, self.BLOB_THRESHOLD),
+        ).fetchall()
+        for test_id, case, ans in rows:
+            case_inline, case_digest = self._test_payload(self._dec(case))
+            ans_inline, ans_digest = self._test_payload(self._dec(ans))
             cur.execute(
-                    """CREATE TABLE IF NOT EXISTS UserTask (
-                        user_id INTEGER NOT NULL REFERENCES User(user_id),
-                        task_id INTEGER NOT NULL REFERENCES Task(task_id),
-                        passed_tests INTEGER DEFAULT 0,
-                        PRIMARY KEY (user_id, task_id)
-                    );"""
+                """UPDATE TestCase SET input_data=?, expected_output=?,
+                                       input_digest=?, expected_digest=?
+                   WHERE test_id=?;""",
+                (case_inline, ans_inline, case_digest, ans_digest, test_id),
             )
 
-            # if database existed before the passed_tests column was added,
-            # ensure the column is present
-            cur.execute("PRAGMA table_info(UserTask);")
-            cols = [row[1] for row in cur.fetchall()]
-            if "passed_tests" not in cols:
-                cur.execute(
-                    "ALTER TABLE UserTask ADD COLUMN passed_tests INTEGER DEFAULT 0;"
-                )
+    def _migration_budgets(self, cur: sql.Cursor) -> None:
+        # per-task defaults and per-test overrides; NULL inherits / uses the grader default
+        for table in ("Task", "TestCase"):
+            cols = [row[1] for row in cur.execute(f"PRAGMA table_info({table});")]
+            for col, kind in (("time_limit", "REAL"), ("cpu_limit", "REAL"), ("memory_limit_kb", "INTEGER")):
+                if col not in cols:
+                    cur.execute(f"ALTER TABLE {table} ADD COLUMN {col} {kind};")
+        cols = [row[1] for row in cur.execute("PRAGMA table_info(SubmissionResult);")]
+        for col, kind in (("verdict", "TEXT"), ("cpu_ms", "REAL")):
+            if col not in cols:
+                cur.execute(f"ALTER TABLE SubmissionResult ADD COLUMN {col} {kind};")
 
-    def _ensure_passed_tests_column(self) -> None:
-        """Ensure the UserTask table has the passed_tests column."""
-        self._cursor.execute("PRAGMA table_info(UserTask);")
-        cols = [row[1] for row in self._cursor.fetchall()]
-        if "passed_tests" not in cols:
-            with self._tx():
-                self._cursor.execute(
-                    "ALTER TABLE UserTask ADD COLUMN passed_tests INTEGER DEFAULT 0;"
-                )
+    def _migration_submission_environment(self, cur: sql.Cursor) -> None:
+        # backend holds the short runner name; the full fingerprint gets its own column
+        cols = [row[1] for row in cur.execute("PRAGMA table_info(Submission);")]
+        if "environment" not in cols:
+            cur.execute("ALTER TABLE Submission ADD COLUMN environment TEXT;")
+        # attempts recorded before stored the fingerprint ("docker:...") as backend
+        cur.execute(
+            """UPDATE Submission SET environment=backend,
+                                     backend=substr(backend, 1, instr(backend, ':') - 1)
+               WHERE environment IS NULL AND instr(backend, ':') > 0;"""
+        )
+        cur.execute("DROP INDEX IF EXISTS idx_submission_code;")
+        cur.execute(
+            """CREATE INDEX IF NOT EXISTS idx_submission_environment
+               ON Submission(task_id, code_hash, environment);"""
+        )
 
     def add_user(self, name: str, hashed_password: str, is_admin: bool):
-        with self._tx():
-            self._cursor.execute(
-                    "INSERT INTO User(name, hashed_password, is_admin) VALUES (?,?,?);",
-                    (name, self._enc(hashed_password), is_admin),
-            )
+        row = (name, self._enc(hashed_password), is_admin)
+
+        def insert(cur: sql.Cursor) -> None:
+            cur.execute("INSERT INTO User(name, hashed_password, is_admin) VALUES (?,?,?);", row)
+            self._invalidate("User", cur.lastrowid)
+
+        self._write(insert)
+
+    def add_users(self, users: Iterable[tuple[str, str, bool]]) -> int:
+        """Add many ``(name, hashed_password, is_admin)`` users in one transaction."""
+        start = time.perf_counter()
+        rows = [(name, self._enc(hashed), is_admin) for name, hashed, is_admin in users]
+
+        def insert(cur: sql.Cursor) -> None:
+            cur.executemany("INSERT INTO User(name, hashed_password, is_admin) VALUES (?,?,?);", rows)
+            self._invalidate("User")
+
+        self._write(insert)
+        self._log_bulk("users", len(rows), start)
+        return len(rows)
 
     def get_users(self):
-        self._cursor.execute("SELECT user_id, name, hashed_password, is_admin FROM User;")
-        for uid, name, hp, adm in self._cursor.fetchall():
-            yield uid, name, self._dec(hp), bool(adm)
+        with self._read() as cur:
+            rows = cur.execute("SELECT user_id, name, hashed_password, is_admin FROM User;").fetchall()
+        for uid, name, hp, adm in rows:
+            yield uid, name, self._dec_cached("User", uid, "hashed_password", hp), bool(adm)
+
+    def list_users(self):
+        """Yield ``(user_id, name, is_admin, has_password)`` without decrypting anything."""
+        with self._read() as cur:
+            rows = cur.execute(
+                "SELECT user_id, name, is_admin, hashed_password IS NOT NULL AND hashed_password != '' FROM User;"
+            ).fetchall()
+        for uid, name, adm, has_pw in rows:
+            yield uid, name, bool(adm), bool(has_pw)
+
+    def get_username(self, user_id: int) -> Optional[str]:
+        with self._read() as cur:
+            row = cur.execute("SELECT name FROM User WHERE user_id=?;", (user_id,)).fetchone()
+        return row[0] if row else None
 
     def get_user_id(self, name: str) -> Optional[int]:
-        self._cursor.execute("SELECT user_id FROM User WHERE name=?;", (name,))
-        res = self._cursor.fetchone()
+        with self._read() as cur:
+            res = cur.execute("SELECT user_id FROM User WHERE name=?;", (name,)).fetchone()
         return res[0] if res else None
 
     def get_password(self, user_id: int) -> Optional[str]:
-        self._cursor.execute("SELECT hashed_password FROM User WHERE user_id=?;", (user_id,))
-        row = self._cursor.fetchone()
-        return self._dec(row[0]) if row else None
+        with self._read() as cur:
+            row = cur.execute("SELECT hashed_password FROM User WHERE user_id=?;", (user_id,)).fetchone()
+        return self._dec_cached("User", user_id, "hashed_password", row[0]) if row else None
 
     def is_admin(self, user_id: int) -> bool:
-        self._cursor.execute("SELECT is_admin FROM User WHERE user_id=?;", (user_id,))
-        row = self._cursor.fetchone()
+        with self._read() as cur:
+            row = cur.execute("SELECT is_admin FROM User WHERE user_id=?;", (user_id,)).fetchone()
         return bool(row[0]) if row else False
 
     def add_task(
@@ -150,119 +615,468 @@ class Database:
         expiration_date: str | None,
         rules: str,
         tests: list[tuple[str, str]] | None = None,
+        limits: Limits | None = None,
     ) -> int:
-        """Add a task and optional test cases. Return new task_id."""
-        with self._tx():
-            cur = self._cursor
-            cur.execute(
-                "INSERT INTO Task(title, description, expiration_date, validation_rules) VALUES (?,?,?,?);",
+        """Add a task and optional test cases. Return new task_id.
+
+        ``limits`` is the task's default budget for its test cases.
+        """
+        return self.add_tasks([(title, description, expiration_date, rules, tests, limits)])[0]
+
+    def add_tasks(
+        self,
+        tasks: Iterable[tuple],
+    ) -> list[int]:
+        """Add many ``(title, description, expiration, rules, tests[, limits])`` tasks in one transaction.
+
+        ``tests`` holds ``(input, expected[, limits])`` tuples (or is ``None``);
+        ``limits`` are :class:`limits.Limits`. Returns the new task ids in input order.
+        """
+        start = time.perf_counter()
+        rows = [
+            (
                 (
                     self._enc(title),
                     self._enc(description),
-                    self._enc(expiration_date) if expiration_date else None,
+                    self._enc(expiration) if expiration else None,
                     self._enc(rules),
+                    self._bidx(title),
+                    self._bidx(expiration) if expiration else None,
+                    *(limits[0] if limits and limits[0] is not None else Limits()),
                 ),
+                [self._test_row(test) for test in tests or ()],
             )
-            task_id = cur.lastrowid
-            if tests:
-                for case, ans in tests:
-                    cur.execute(
-                        "INSERT INTO TestCase(input_data, expected_output, task_id) VALUES (?,?,?);",
-                        (
-                            self._enc(case),
-                            self._enc(ans),
-                            task_id,
-                        ),
-                    )
-        return task_id
+            for title, description, expiration, rules, tests, *limits in tasks
+        ]
+
+        def insert(cur: sql.Cursor) -> list[int]:
+            task_ids = []
+            for task, cases in rows:
+                # one execute per task: executemany does not report every lastrowid
+                cur.execute(
+                    """INSERT INTO Task(title, description, expiration_date, validation_rules,
+                                        title_bidx, expiration_bidx,
+                                        time_limit, cpu_limit, memory_limit_kb)
+                       VALUES (?,?,?,?,?,?,?,?,?);""",
+                    task,
+                )
+                task_id = cur.lastrowid
+                task_ids.append(task_id)
+                self._invalidate("Task", task_id)
+                if cases:
+                    cur.executemany(_INSERT_TEST_CASE, [(*case, task_id) for case in cases])
+            if any(cases for _, cases in rows):
+                self._invalidate("TestCase")
+            return task_ids
+
+        task_ids = self._write(insert)
+        self._log_bulk("tasks", len(task_ids), start)
+        return task_ids
+
+    def get_task(self, task_id: int):
+        """Return the task as a lazily decrypted :class:`TaskRow` or ``None``."""
+        with self._read() as cur:
+            row = cur.execute(
+                "SELECT title, description, expiration_date, validation_rules FROM Task WHERE task_id=?;",
+                (task_id,),
+            ).fetchone()
+        return TaskRow(self, task_id, *row) if row else None
+
+    def get_task_title(self, task_id: int) -> Optional[str]:
+        with self._read() as cur:
+            row = cur.execute("SELECT title FROM Task WHERE task_id=?;", (task_id,)).fetchone()
+        return self._dec_cached("Task", task_id, "title", row[0]) if row else None
 
     def get_tasks_for_user(self, user_id: int):
-        self._ensure_passed_tests_column()
-        self._cursor.execute(
-            """SELECT t.task_id, t.title, t.description, t.expiration_date,
-                      t.validation_rules, ut.passed_tests
-               FROM Task t JOIN UserTask ut ON t.task_id = ut.task_id
-               WHERE ut.user_id=?;""",
-            (user_id,),
-        )
-        for row in self._cursor.fetchall():
-            tid, tl, desc, exp, rules, passed = row
-            yield (
-                tid,
-                self._dec(tl),
-                self._dec(desc),
-                self._dec(exp) if exp else None,
-                self._dec(rules),
-                passed,
-            )
+        with self._read() as cur:
+            rows = cur.execute(
+                """SELECT t.task_id, t.title, t.description, t.expiration_date,
+                          t.validation_rules, ut.passed_tests
+                   FROM Task t JOIN UserTask ut ON t.task_id = ut.task_id
+                   WHERE ut.user_id=?;""",
+                (user_id,),
+            ).fetchall()
+        for row in rows:
+            yield TaskRow(self, *row)
+
+    def get_tasks_for_user_with_counts(self, user_id: int):
+        """Like :meth:`get_tasks_for_user` plus the task's test count, in one query.
+
+        Yields :class:`TaskRow` objects with ``passed`` and ``total_tests`` set.
+        """
+        with self._read() as cur:
+            rows = cur.execute(
+                """SELECT t.task_id, t.title, t.description, t.expiration_date,
+                          t.validation_rules, ut.passed_tests, COUNT(tc.test_id)
+                   FROM UserTask ut
+                   JOIN Task t ON t.task_id = ut.task_id
+                   LEFT JOIN TestCase tc ON tc.task_id = t.task_id
+                   WHERE ut.user_id=?
+                   GROUP BY t.task_id;""",
+                (user_id,),
+            ).fetchall()
+        for row in rows:
+            yield TaskRow(self, *row)
 
     def get_tasks(self):
-        """Yield all tasks in the Task table (decoded)."""
-        self._cursor.execute(
+        """Yield all tasks in the Task table as lazily decrypted :class:`TaskRow` objects."""
+        with self._read() as cur:
+            rows = cur.execute(
                 "SELECT task_id, title, description, expiration_date, validation_rules FROM Task;"
-        )
-        for tid, tl, desc, exp, rules in self._cursor.fetchall():
-            yield (
-                tid,
-                self._dec(tl),
-                self._dec(desc),
-                self._dec(exp) if exp else None,
-                self._dec(rules),
-            )
+            ).fetchall()
+        for tid, tl, desc, exp, rules in rows:
+            yield TaskRow(self, tid, tl, desc, exp, rules)
 
-    def add_test_case(self, task_id: int, input_data: str, expected_output: str):
-        """Add a new test case for the given task."""
-        with self._tx():
-            self._cursor.execute(
-                "INSERT INTO TestCase(input_data, expected_output, task_id) VALUES (?,?,?);",
-                (
-                    self._enc(input_data),
-                    self._enc(expected_output),
-                    task_id,
-                ),
+    def _find_tasks(self, column: str, value: str):
+        with self._read() as cur:
+            rows = cur.execute(
+                f"""SELECT task_id, title, description, expiration_date, validation_rules
+                    FROM Task WHERE {column}=?;""",
+                (self._bidx(value),),
+            ).fetchall()
+        for tid, tl, desc, exp, rules in rows:
+            yield TaskRow(self, tid, tl, desc, exp, rules)
+
+    def find_tasks_by_title(self, title: str):
+        """Yield tasks whose title equals ``title`` (case-insensitive), via the blind index."""
+        return self._find_tasks("title_bidx", title)
+
+    def find_tasks_by_expiration(self, expiration_date: str):
+        """Yield tasks due on ``expiration_date``, via the blind index."""
+        return self._find_tasks("expiration_bidx", expiration_date)
+
+    def add_test_case(self, task_id: int, input_data: str, expected_output: str,
+                      limits: Limits | None = None) -> int:
+        """Add a new test case for the given task. Return new test_id."""
+        row = (*self._test_row((input_data, expected_output, limits)), task_id)
+
+        def insert(cur: sql.Cursor) -> int:
+            cur.execute(_INSERT_TEST_CASE, row)
+            self._invalidate("TestCase", cur.lastrowid)
+            return cur.lastrowid
+
+        return self._write(insert)
+
+    def add_test_cases(self, task_id: int, tests: Iterable[tuple]) -> int:
+        """Attach many ``(input, expected_output[, limits])`` test cases to a task in one transaction."""
+        start = time.perf_counter()
+        rows = [(*self._test_row(test), task_id) for test in tests]
+
+        def insert(cur: sql.Cursor) -> None:
+            cur.executemany(_INSERT_TEST_CASE, rows)
+            self._invalidate("TestCase")
+
+        self._write(insert)
+        self._log_bulk("test cases", len(rows), start)
+        return len(rows)
+
+    def get_test_cases(self, task_id: int, *, lazy: bool = False, with_limits: bool = False):
+        """Yield (case, answer) pairs for the task.
+
+        With ``lazy=True`` payloads kept in the blob store are yielded as
+        :class:`blob_store.BlobRef` handles instead of being read into memory.
+        With ``with_limits=True`` every pair gets a third element, the test's
+        :class:`limits.Limits` with unset fields taken from the task.
+        """
+        with self._read() as cur:
+            rows = cur.execute(
+                """SELECT tc.test_id, tc.input_data, tc.input_digest,
+                          tc.expected_output, tc.expected_digest,
+                          COALESCE(tc.time_limit, t.time_limit),
+                          COALESCE(tc.cpu_limit, t.cpu_limit),
+                          COALESCE(tc.memory_limit_kb, t.memory_limit_kb)
+                   FROM TestCase tc JOIN Task t ON t.task_id = tc.task_id
+                   WHERE tc.task_id=?;""",
+                (task_id,),
+            ).fetchall()
+        for test_id, case, case_digest, ans, ans_digest, *limits in rows:
+            test = (
+                self._test_value(test_id, "input_data", case, case_digest, lazy),
+                self._test_value(test_id, "expected_output", ans, ans_digest, lazy),
             )
+            yield (*test, Limits(*limits)) if with_limits else test
 
-    def get_test_cases(self, task_id: int):
-        """Yield (case, answer) pairs for the task."""
-        self._cursor.execute(
-            "SELECT input_data, expected_output FROM TestCase WHERE task_id=?;",
-            (task_id,),
-        )
-        for case, ans in self._cursor.fetchall():
-            yield self._dec(case), self._dec(ans)
+    def get_task_limits(self, task_id: int) -> Limits:
+        """Return the task's default budget (all ``None`` if unset or unknown)."""
+        with self._read() as cur:
+            row = cur.execute(
+                "SELECT time_limit, cpu_limit, memory_limit_kb FROM Task WHERE task_id=?;",
+                (task_id,),
+            ).fetchone()
+        return Limits(*row) if row else Limits()
+
+    def set_task_limits(self, task_id: int, limits: Limits):
+        """Replace the task's default budget."""
+        self._write(lambda cur: cur.execute(
+            "UPDATE Task SET time_limit=?, cpu_limit=?, memory_limit_kb=? WHERE task_id=?;",
+            (*limits, task_id),
+        ))
+
+    def set_test_limits(self, test_id: int, limits: Limits):
+        """Replace the budget of one test case (``None`` fields inherit from the task)."""
+        self._write(lambda cur: cur.execute(
+            "UPDATE TestCase SET time_limit=?, cpu_limit=?, memory_limit_kb=? WHERE test_id=?;",
+            (*limits, test_id),
+        ))
+
+    def collect_blob_garbage(self) -> int:
+        """Delete blobs no test case refers to any more; return how many were removed.
+
+        Run it while no test cases are being added: a new blob is written
+        before the row that refers to it.
+        """
+        with self._read() as cur:
+            rows = cur.execute(
+                """SELECT input_digest FROM TestCase WHERE input_digest IS NOT NULL
+                   UNION SELECT expected_digest FROM TestCase WHERE expected_digest IS NOT NULL;"""
+            ).fetchall()
+        return self.blobs.collect_garbage({digest for (digest,) in rows})
 
     def assign_task(self, user_id: int, task_id: int):
         """Assign a task to the user."""
-        with self._tx():
-            self._cursor.execute(
-                "INSERT OR IGNORE INTO UserTask(user_id, task_id) VALUES (?,?);",
-                (user_id, task_id),
-            )
+        self._write(lambda cur: cur.execute(
+            "INSERT OR IGNORE INTO UserTask(user_id, task_id) VALUES (?,?);",
+            (user_id, task_id),
+        ))
+
+    def assign_task_to_users(self, task_id: int, user_ids: Iterable[int]) -> int:
+        """Assign a task to every user in ``user_ids`` in one transaction.
+
+        Existing assignments are kept; returns the number of new ones.
+        """
+        start = time.perf_counter()
+        rows = [(uid, task_id) for uid in user_ids]
+
+        def insert(cur: sql.Cursor) -> int:
+            before = cur.connection.total_changes
+            cur.executemany("INSERT OR IGNORE INTO UserTask(user_id, task_id) VALUES (?,?);", rows)
+            return cur.connection.total_changes - before
+
+        added = self._write(insert)
+        self._log_bulk("assignments", len(rows), start)
+        return added
 
     def update_task_progress(self, user_id: int, task_id: int, passed_tests: int):
         """Update how many tests the user passed for a task."""
-        self._ensure_passed_tests_column()
-        with self._tx():
-            self._cursor.execute(
-                "UPDATE UserTask SET passed_tests=? WHERE user_id=? AND task_id=?;",
-                (passed_tests, user_id, task_id),
-            )
+        self._write(lambda cur: cur.execute(
+            "UPDATE UserTask SET passed_tests=? WHERE user_id=? AND task_id=?;",
+            (passed_tests, user_id, task_id),
+        ))
+
+    def update_task_progress_many(self, task_id: int, progress: list[tuple[int, int]]) -> int:
+        """Store ``(user_id, passed_tests)`` pairs for a task in one transaction.
+
+        Only existing assignments are updated; returns the number of rows changed.
+        """
+        rows = [(passed, uid, task_id) for uid, passed in progress]
+        return self._write(lambda cur: cur.executemany(
+            "UPDATE UserTask SET passed_tests=? WHERE user_id=? AND task_id=?;",
+            rows,
+        ).rowcount)
 
     def get_task_progress(self, user_id: int, task_id: int) -> int:
         """Return number of passed tests for this user and task."""
-        self._ensure_passed_tests_column()
-        self._cursor.execute(
-            "SELECT passed_tests FROM UserTask WHERE user_id=? AND task_id=?;",
-            (user_id, task_id),
-        )
-        row = self._cursor.fetchone()
+        with self._read() as cur:
+            row = cur.execute(
+                "SELECT passed_tests FROM UserTask WHERE user_id=? AND task_id=?;",
+                (user_id, task_id),
+            ).fetchone()
         return row[0] if row else 0
 
     def count_tests(self, task_id: int) -> int:
         """Return how many tests exist for a task."""
-        self._cursor.execute(
-            "SELECT COUNT(*) FROM TestCase WHERE task_id=?;",
-            (task_id,),
-        )
-        row = self._cursor.fetchone()
+        with self._read() as cur:
+            row = cur.execute(
+                "SELECT COUNT(*) FROM TestCase WHERE task_id=?;",
+                (task_id,),
+            ).fetchone()
         return row[0] if row else 0
+
+    def get_cached_result(self, cache_key: str) -> Optional[str]:
+        """Return the stored grading result payload for ``cache_key``."""
+        with self._read() as cur:
+            row = cur.execute(
+                "SELECT payload FROM ResultCache WHERE cache_key=?;",
+                (cache_key,),
+            ).fetchone()
+        return self._dec(row[0]) if row else None
+
+    def put_cached_result(self, cache_key: str, payload: str):
+        """Queue a grading result payload (JSON) for storage under ``cache_key``.
+
+        Does not wait for the write; grading threads never block on the disk.
+        """
+        row = (cache_key, self._enc(payload))
+        self._write(
+            lambda cur: cur.execute(
+                "INSERT OR REPLACE INTO ResultCache(cache_key, payload) VALUES (?,?);", row
+            ),
+            wait=False,
+        )
+
+    def prune_result_cache(self, keep: int = 10000, *, wait: bool = True):
+        """Drop all but the ``keep`` most recent cached grading results.
+
+        With ``wait=False`` the delete is only queued, like :meth:`put_cached_result`.
+        """
+        self._write(lambda cur: cur.execute(
+            """DELETE FROM ResultCache WHERE cache_key NOT IN (
+                   SELECT cache_key FROM ResultCache
+                   ORDER BY created_at DESC LIMIT ?
+               );""",
+            (keep,),
+        ), wait=wait)
+
+    # ------------------------------------------------------------------ #
+    # submission history
+    # ------------------------------------------------------------------ #
+    def record_submission(
+        self,
+        user_id: int,
+        task_id: int,
+        code_hash: str,
+        backend: str,
+        results: list[dict],
+        environment: str | None = None,
+    ) -> int:
+        """Store one graded attempt and its per-test results. Return submission_id.
+
+        ``backend`` is the runner's short name (``runner.backend_name()``) and
+        ``environment`` its full ``fingerprint()``.
+        """
+        return self.record_submissions(
+            [(user_id, task_id, code_hash, backend, results, environment)]
+        )[0]
+
+    def record_submissions(
+        self,
+        submissions: Iterable[tuple],
+    ) -> list[int]:
+        """Store many ``(user_id, task_id, code_hash, backend, results[, environment])`` attempts.
+
+        All of them are written in one transaction. ``results`` are the
+        per-test dicts returned by :func:`task_checker.check_solution`; see
+        :meth:`record_submission` for ``backend`` and ``environment``. Returns
+        the new ids in input order.
+        """
+        start = time.perf_counter()
+        rows = []
+        for user_id, task_id, code_hash, backend, results, *extra in submissions:
+            environment = extra[0] if extra else None
+            tests = [
+                (
+                    idx,
+                    bool(res.get("passed")),
+                    res.get("status"),
+                    bool(res.get("timed_out")),
+                    res["elapsed"] * 1000 if res.get("elapsed") is not None else None,
+                    res.get("memory_kb"),
+                    res.get("verdict"),
+                    res["cpu_time"] * 1000 if res.get("cpu_time") is not None else None,
+                )
+                for idx, res in enumerate(results)
+            ]
+            timings = [t[4] for t in tests if t[4] is not None]
+            rows.append((
+                (
+                    user_id,
+                    task_id,
+                    code_hash,
+                    backend,
+                    sum(t[1] for t in tests),
+                    len(tests),
+                    sum(timings) if timings else None,
+                    environment,
+                ),
+                tests,
+            ))
+
+        def insert(cur: sql.Cursor) -> list[int]:
+            ids = []
+            for submission, tests in rows:
+                cur.execute(
+                    """INSERT INTO Submission(user_id, task_id, code_hash, backend,
+                                              passed_tests, total_tests, runtime_ms, environment)
+                       VALUES (?,?,?,?,?,?,?,?);""",
+                    submission,
+                )
+                submission_id = cur.lastrowid
+                ids.append(submission_id)
+                cur.executemany(
+                    """INSERT INTO SubmissionResult(submission_id, test_index, passed, status,
+                                                    timed_out, runtime_ms, memory_kb,
+                                                    verdict, cpu_ms)
+                       VALUES (?,?,?,?,?,?,?,?,?);""",
+                    [(submission_id, *test) for test in tests],
+                )
+            return ids
+
+        ids = self._write(insert)
+        self._log_bulk("submissions", len(ids), start)
+        return ids
+
+    def _query_submissions(self, where: str, params: tuple, order: str, limit: int | None = None):
+        sql_text = f"SELECT {_SUBMISSION_COLUMNS} FROM Submission WHERE {where} ORDER BY {order}"
+        if limit is not None:
+            sql_text += f" LIMIT {limit:d}"
+        with self._read() as cur:
+            rows = cur.execute(sql_text + ";", params).fetchall()
+        return [Submission(*row) for row in rows]
+
+    def get_submissions(self, user_id: int, task_id: int) -> list[Submission]:
+        """Return every attempt of the user at the task, newest first."""
+        return self._query_submissions(
+            "user_id=? AND task_id=?", (user_id, task_id), "submission_id DESC"
+        )
+
+    def get_latest_submission(self, user_id: int, task_id: int) -> Optional[Submission]:
+        """Return the user's most recent attempt at the task or ``None``."""
+        rows = self._query_submissions(
+            "user_id=? AND task_id=?", (user_id, task_id), "submission_id DESC", 1
+        )
+        return rows[0] if rows else None
+
+    def get_best_submission(self, user_id: int, task_id: int) -> Optional[Submission]:
+        """Return the user's highest scoring attempt (the earliest one on ties) or ``None``."""
+        rows = self._query_submissions(
+            "user_id=? AND task_id=?", (user_id, task_id), "passed_tests DESC, submission_id", 1
+        )
+        return rows[0] if rows else None
+
+    def find_submission(self, task_id: int, code_hash: str, environment: str) -> Optional[Submission]:
+        """Return the latest attempt at the task with identical code in the same environment.
+
+        ``environment`` is the runner ``fingerprint()`` the attempt was
+        recorded with. Its per-test outcomes can be reused instead of running
+        the code again.
+        """
+        rows = self._query_submissions(
+            "task_id=? AND code_hash=? AND environment=?",
+            (task_id, code_hash, environment),
+            "submission_id DESC",
+            1,
+        )
+        return rows[0] if rows else None
+
+    def get_submission_results(self, submission_id: int) -> list[dict]:
+        """Return the per-test outcomes of a submission in test order."""
+        with self._read() as cur:
+            rows = cur.execute(
+                """SELECT test_index, passed, status, timed_out, runtime_ms, memory_kb,
+                          verdict, cpu_ms
+                   FROM SubmissionResult WHERE submission_id=? ORDER BY test_index;""",
+                (submission_id,),
+            ).fetchall()
+        return [
+            {
+                "test_index": idx,
+                "passed": bool(passed),
+                "status": status,
+                "timed_out": bool(timed_out),
+                "runtime_ms": runtime_ms,
+                "memory_kb": memory_kb,
+                "verdict": verdict,
+                "cpu_ms": cpu_ms,
+            }
+            for idx, passed, status, timed_out, runtime_ms, memory_kb, verdict, cpu_ms in rows
+        ]
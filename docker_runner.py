@@ -1,38 +1,211 @@
+import json
+import os
+import sys
 import tempfile
-import subprocess
 import shutil
+import threading
+import uuid
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 try:
     import docker  # type: ignore
 except Exception:  # pragma: no cover - optional dependency
     docker = None
 
+from container_pool import HARDENING, SCRATCH_TMPFS, get_pool, share_with_sandbox
+from limits import Limits
+from local_sandbox import CGROUP_ROOT, LocalSandbox, parse_size
+from logger import log
+from output_compare import write_text
+from run_watchdog import GRACE, Watchdog, read_bounded
+from sandbox_harness import MAX_OUTPUT, cap_output, parse_report, report_limit
+
+HARNESS_SOURCE = Path(__file__).with_name("sandbox_harness.py")
+
+# Host-wide cap on simultaneously running sandboxes (containers or local
+# processes), shared by every runner and every worker thread.
+MAX_CONCURRENT_SANDBOXES = int(os.environ.get("PYGRADER_MAX_SANDBOXES", os.cpu_count() or 2))
+_sandbox_slots = threading.BoundedSemaphore(MAX_CONCURRENT_SANDBOXES)
+
+
+@contextmanager
+def staged_expected(workdir: str, expected: list | None, count: int):
+    """Write the expected outputs of ``count`` cases into ``workdir``.
+
+    ``expected`` holds one string, blob handle or ``None`` per case. Yields
+    the file names (relative to ``workdir``, ``None`` where nothing is
+    expected); the files are removed on exit.
+    """
+    suffix = uuid.uuid4().hex[:12]
+    names: list[str | None] = []
+    try:
+        for i, value in enumerate(expected or [None] * count):
+            if value is None:
+                names.append(None)
+                continue
+            names.append(f"_pygrader_expected_{suffix}_{i}.txt")
+            write_text(value if hasattr(value, "chunks") else str(value), Path(workdir, names[-1]))
+        yield names
+    finally:
+        for name in names:
+            if name is not None:
+                Path(workdir, name).unlink(missing_ok=True)
+
+
+@contextmanager
+def staged_harness(workdir: str, entry: str, cases: list[list[str]], timeout: float,
+                   limits: list[Limits | None] | None, file_size: int | None,
+                   expected: list | None = None):
+    """Copy :mod:`sandbox_harness` and the case specs of ``cases`` into ``workdir``.
+
+    Yields ``(argv, specs, batch_timeout)``: the harness command line relative
+    to ``workdir`` (without the interpreter), the per-case specs and a
+    timeout for the whole batch. With ``expected`` (one expected output or
+    ``None`` per case) the harness also locates the first difference of every
+    case's output. All staged files are removed on exit.
+    """
+    # unique names so that concurrent batches may share one project directory
+    suffix = uuid.uuid4().hex[:12]
+    harness = Path(workdir, f"_pygrader_harness_{suffix}.py")
+    cases_file = Path(workdir, f"_pygrader_cases_{suffix}.json")
+    try:
+        with staged_expected(workdir, expected, len(cases)) as expected_files:
+            specs = []
+            for args, lim, want in zip(cases, limits or [None] * len(cases), expected_files):
+                lim = lim or Limits()
+                specs.append({"args": args, "timeout": lim.time or timeout,
+                              "cpu_limit": lim.cpu, "memory_kb": lim.memory_kb,
+                              "file_size": file_size, "expected": want})
+            shutil.copyfile(HARNESS_SOURCE, harness)
+            cases_file.write_text(json.dumps(specs))
+            # every case is bounded by its timeout; leave headroom for the harness itself
+            batch_timeout = sum(spec["timeout"] for spec in specs) + 10
+            yield [harness.name, entry, cases_file.name], specs, batch_timeout
+    finally:
+        harness.unlink(missing_ok=True)
+        cases_file.unlink(missing_ok=True)
+
+
+def harness_results(res: Dict[str, Any], specs: list[dict], workdir: str) -> List[Dict[str, Any]]:
+    """Per-case records from the execution record ``res`` of a harness run.
+
+    The harness's stdout must be exactly one report frame and the harness
+    must have exited cleanly; anything else (for instance a solution that
+    killed the harness) is a harness failure, never a set of results.
+    """
+    output = res.get("output") or ""
+    try:
+        payload = parse_report(output) if res.get("status") == 0 else None
+    except ValueError:
+        payload = None
+    if isinstance(payload, dict):
+        raise RuntimeError(f"Test harness failed:\n{payload.get('error')}")
+    if isinstance(payload, list) and len(payload) == len(specs):
+        return payload
+    if res.get("timed_out"):
+        # the harness reports only at the end; every case counts as timed out
+        log.warning("Test harness timed out in %s", workdir)
+        return [
+            {"status": res.get("status"), "output": "", "tail": "", "size": 0, "digest": None,
+             "elapsed": spec["timeout"], "timed_out": True, "truncated": False,
+             "cpu_time": None, "memory_kb": None}
+            for spec in specs
+        ]
+    raise RuntimeError(f"Test harness failed (status {res.get('status')}):\n{output[:4096]}")
+
 
 class DockerTaskRunner:
     """Utility class to run Python code inside a restricted Docker container.
 
     If the Docker Python library or the ``docker`` executable is not available,
     the code will be executed directly on the host as a fallback. This keeps the
-    rest of the application working even in minimal environments.
+    rest of the application working even in minimal environments. The fallback
+    applies the same CPU, memory and process limits through
+    :class:`local_sandbox.LocalSandbox` (rlimits, plus a cgroup per run when
+    ``cgroup_root`` names a delegated cgroup v2 directory).
+
+    With Docker available, runs are served from a shared pool of warm
+    containers (see :class:`container_pool.ContainerPool`). Pass
+    ``pool_size=0`` to start a fresh container for every run instead.
     """
 
     def __init__(self,
                  image: str = "python:3.10-slim",
                  cpu_limit: float = 0.5,
                  mem_limit: str = "512m",
-                 pids_limit: int = 64):
+                 pids_limit: int = 64,
+                 pool_size: int = 2,
+                 pool_idle_timeout: float = 300.0,
+                 file_size_limit: str = "64m",
+                 cgroup_root: str | None = CGROUP_ROOT):
         self.image = image
         self.cpu_limit = cpu_limit
         self.mem_limit = mem_limit
         self.pids_limit = pids_limit
+        self.file_size_limit = parse_size(file_size_limit)
+        self.pool = None
+        self.local = None
+        self._active: set = set()
+        self._active_lock = threading.Lock()
+        self._killed = False
         self.use_docker = docker is not None
         if self.use_docker:
             try:
                 self.client = docker.from_env()
             except Exception:
                 self.use_docker = False
+        if self.use_docker and pool_size > 0:
+            self.pool = get_pool(
+                self.client,
+                image,
+                cpu_limit=cpu_limit,
+                mem_limit=mem_limit,
+                pids_limit=pids_limit,
+                size=pool_size,
+                idle_timeout=pool_idle_timeout,
+            )
+        if not self.use_docker:
+            self.local = LocalSandbox(
+                cpu_limit=cpu_limit,
+                mem_limit=mem_limit,
+                pids_limit=pids_limit,
+                file_size_limit=self.file_size_limit,
+                cgroup_root=cgroup_root,
+            )
+
+    def backend_name(self) -> str:
+        """Short name of the backend runs go to: ``"docker"`` or ``"local"``."""
+        return "docker" if self.use_docker else "local"
+
+    def fingerprint(self) -> str:
+        """Describe the execution environment; part of result cache keys."""
+        if self.use_docker:
+            return f"docker:{self.image}:{self.cpu_limit}:{self.mem_limit}:{self.pids_limit}"
+        return f"local:{sys.version}:{self.local.fingerprint()}"
+
+    @contextmanager
+    def _tracking(self, kill):
+        """Register ``kill`` so :meth:`kill_active` can stop the current run."""
+        with self._active_lock:
+            self._active.add(kill)
+        try:
+            yield
+        finally:
+            with self._active_lock:
+                self._active.discard(kill)
+
+    def kill_active(self) -> None:
+        """Forcefully stop every run in flight; the runner refuses new runs afterwards."""
+        with self._active_lock:
+            self._killed = True
+            kills = list(self._active)
+        for kill in kills:
+            try:
+                kill()
+            except Exception:  # already finished
+                pass
 
     def run_code(
         self,
@@ -42,6 +215,8 @@ class DockerTaskRunner:
         entry: str = "main.py",
         args: list[str] | None = None,
         timeout: int = 5,
+        limits: Limits | None = None,
+        expected=None,
     ) -> Dict[str, Any]:
         """Run the provided Python code inside the container and return execution info.
 
@@ -59,6 +234,11 @@ class DockerTaskRunner:
             Arguments to pass to the script as ``sys.argv[1:]``.
         timeout: int, optional
             Maximum execution time in seconds.
+        limits: Limits | None, optional
+            CPU / memory budget of this run; its ``time`` overrides ``timeout``.
+        expected: str | BlobRef | None, optional
+            Expected output; the record then reports where the output first
+            differs from it (``difference``, see :mod:`sandbox_harness`).
         """
         if args is None:
             args = []
@@ -72,16 +252,41 @@ class DockerTaskRunner:
                 code_path.write_text(code)
                 workdir = tmpdir
                 entry_path = code_path.name
-                return self._execute(workdir, entry_path, args, timeout)
+                return self._run_single(workdir, entry_path, args, timeout, limits, expected)
         else:
             workdir = Path(dir_path)
             if not workdir.is_dir():
                 raise FileNotFoundError(f"Directory not found: {workdir}")
-            return self._execute(str(workdir), entry, args, timeout)
+            return self._run_single(str(workdir), entry, args, timeout, limits, expected)
+
+    def _run_single(self, workdir: str, entry: str, args: list[str], timeout: int,
+                    limits: Limits | None, expected=None) -> Dict[str, Any]:
+        # Docker only reports stats for running containers, and a local child's
+        # peak RSS would include the grader it was forked from; the harness
+        # measures the solution in a child of its own small interpreter instead
+        return self._execute_batch(workdir, entry, [args], timeout, [limits], [expected])[0]
+
+    def _execute(self, workdir: str, entry: str, args: list[str], timeout: int,
+                 max_output: int | None = MAX_OUTPUT) -> Dict[str, Any]:
+        """Helper to execute ``entry`` inside ``workdir`` either in Docker or locally.
 
-    def _execute(self, workdir: str, entry: str, args: list[str], timeout: int) -> Dict[str, Any]:
-        """Helper to execute ``entry`` inside ``workdir`` either in Docker or locally."""
+        Blocks while :data:`MAX_CONCURRENT_SANDBOXES` runs are already active.
+        At most ``max_output`` bytes of output are kept (``None``: all of it).
+        A run that exceeds ``timeout`` is killed and returned with ``timed_out``
+        set and whatever output it produced until then.
+        """
+        with _sandbox_slots:
+            if self._killed:
+                raise RuntimeError("runner was killed")
+            return self._execute_unbounded(workdir, entry, args, timeout, max_output)
+
+    def _execute_unbounded(self, workdir: str, entry: str, args: list[str], timeout: int,
+                           max_output: int | None) -> Dict[str, Any]:
+        if self.pool is not None:
+            return self.pool.run(workdir, entry, args, timeout,
+                                 track=lambda c: self._tracking(c.kill), max_output=max_output)
         if self.use_docker:
+            share_with_sandbox(workdir)
             container = self.client.containers.run(
                 self.image,
                 command=["python", entry, *args],
@@ -93,31 +298,93 @@ class DockerTaskRunner:
                 cpu_period=100000,
                 cpu_quota=int(self.cpu_limit * 100000),
                 pids_limit=self.pids_limit,
+                tmpfs={"/tmp": SCRATCH_TMPFS["/tmp"]},
                 stdout=True,
                 stderr=True,
+                **HARDENING,
             )
             try:
-                result = container.wait(timeout=timeout)
-                logs = container.logs(stdout=True, stderr=True).decode()
-                stats = container.stats(stream=False)
+                dog = Watchdog(timeout, container.kill,
+                               escalate=lambda: container.remove(force=True))
+                with self._tracking(container.kill), dog:
+                    try:
+                        result = container.wait(timeout=timeout + 2 * GRACE)
+                    except Exception:
+                        if not dog.fired:
+                            raise
+                        result = {}  # removed by the watchdog or the daemon gave up
+                try:
+                    logs, dropped = read_bounded(
+                        container.logs(stdout=True, stderr=True, stream=True),
+                        None if max_output is None else max_output + 1,
+                    )
+                except Exception:
+                    if not dog.fired:
+                        raise
+                    logs, dropped = b"", False
+                output, truncated = cap_output(logs, max_output)
             finally:
-                container.remove(force=True)
+                try:
+                    container.remove(force=True)
+                except Exception as exc:  # already removed by the watchdog
+                    log.debug("Failed to remove container: %s", exc)
 
             return {
                 "status": result.get("StatusCode"),
-                "output": logs,
-                "stats": stats,
-            }
-        else:
-            proc = subprocess.run(
-                ["python", entry, *args],
-                cwd=workdir,
-                capture_output=True,
-                text=True,
-                timeout=timeout,
-            )
-            return {
-                "status": proc.returncode,
-                "output": proc.stdout + proc.stderr,
+                "output": output,
+                "truncated": truncated or dropped,
+                "elapsed": dog.elapsed,
+                "timed_out": dog.fired,
                 "stats": None,
             }
+        return self.local.run(workdir, entry, args, timeout,
+                              track=self._tracking, max_output=max_output)
+
+    def run_batch(
+        self,
+        code: str | None = None,
+        *,
+        dir_path: str | Path | None = None,
+        entry: str = "main.py",
+        cases: list[list[str]],
+        timeout: int = 5,
+        limits: list[Limits | None] | None = None,
+        expected: list | None = None,
+    ) -> List[Dict[str, Any]]:
+        """Run the solution once per element of ``cases`` in a single sandbox session.
+
+        The solution is staged once together with :mod:`sandbox_harness`,
+        which executes every argument list and reports the outcome of each
+        one. ``timeout`` applies to every case individually unless the
+        matching entry of ``limits`` sets its own budget.
+
+        Returns one ``{"status", "output", "tail", "size", "digest", "elapsed",
+        "cpu_time", "memory_kb", "timed_out", "truncated"}`` dict per case, in
+        the order of ``cases`` (see :func:`sandbox_harness.summarize_output`).
+        With ``expected`` (one expected output or ``None`` per case) a record
+        also reports ``difference``, where its whole output first differs.
+        """
+        if not cases:
+            return []
+        if dir_path is None:
+            if code is None:
+                raise ValueError("code must be provided when dir_path is None")
+            with tempfile.TemporaryDirectory() as tmpdir:
+                Path(tmpdir, "main.py").write_text(code)
+                return self._execute_batch(tmpdir, "main.py", cases, timeout, limits, expected)
+
+        workdir = Path(dir_path)
+        if not workdir.is_dir():
+            raise FileNotFoundError(f"Directory not found: {workdir}")
+        return self._execute_batch(str(workdir), entry, cases, timeout, limits, expected)
+
+    def _execute_batch(self, workdir: str, entry: str, cases: list[list[str]], timeout: int,
+                       limits: list[Limits | None] | None = None,
+                       expected: list | None = None) -> List[Dict[str, Any]]:
+        """Stage the harness in ``workdir`` and run all ``cases`` through it."""
+        with staged_harness(workdir, entry, cases, timeout, limits, self.file_size_limit,
+                            expected) as (argv, specs, batch_timeout):
+            # the harness summarises every case itself, so its report is bounded
+            res = self._execute(workdir, argv[0], argv[1:], batch_timeout,
+                                max_output=report_limit(len(specs)))
+        return harness_results(res, specs, workdir)
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Any
+
+from database import PRAGMA_PROFILES, Database
+from result_cache import source_digest
+from task_checker import RUNNER_BACKENDS, check_solution, create_runner
+from utils import ENCRYPTION_KEY
+
+REPORT_FIELDS = ("submission", "user", "user_id", "passed", "total", "status", "error", "seconds",
+                 "code_hash")
+
+
+def find_submissions(directory: Path) -> list[Path]:
+    """Return every ``.zip`` and ``.py`` file in ``directory`` (sorted by name)."""
+    return sorted(
+        p for p in directory.iterdir()
+        if p.is_file() and p.suffix.lower() in (".zip", ".py")
+    )
+
+
+def grade_submission(
+    path: Path, tests: list[tuple[str, str]], backend: str, timeout: int
+) -> tuple[Dict[str, Any], list[Dict[str, Any]], tuple[str, str] | None]:
+    """Grade one submission file; the file stem is taken as the user name.
+
+    Returns the report row, the per-test results and the runner's
+    ``(backend_name, fingerprint)``.
+    """
+    results: list[Dict[str, Any]] = []
+    environment = None
+    row: Dict[str, Any] = {
+        "submission": path.name,
+        "user": path.stem,
+        "total": len(tests),
+        "passed": 0,
+        "status": "ok",
+        "error": "",
+        "code_hash": "",
+    }
+    start = time.perf_counter()
+    try:
+        runner = create_runner(backend)
+        environment = (runner.backend_name(), runner.fingerprint())
+        if path.suffix.lower() == ".zip":
+            row["code_hash"] = source_digest(archive=path)
+            results, passed = check_solution(tests, archive=path, runner=runner, timeout=timeout)
+        else:
+            code = path.read_text(encoding="utf-8", errors="replace")
+            row["code_hash"] = source_digest(code=code)
+            results, passed = check_solution(tests, code=code, runner=runner, timeout=timeout)
+        row["passed"] = passed
+    except Exception as exc:
+        row["status"] = "error"
+        row["error"] = str(exc)
+    row["seconds"] = round(time.perf_counter() - start, 4)
+    return row, results, environment
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(rows: list[Dict[str, Any]], wall: float) -> Dict[str, Any]:
+    """Throughput statistics for a grading run."""
+    latencies = [r["seconds"] for r in rows]
+    tests_run = sum(r["total"] for r in rows if r["status"] == "ok")
+    return {
+        "submissions": len(rows),
+        "errors": sum(1 for r in rows if r["status"] != "ok"),
+        "tests_run": tests_run,
+        "wall_seconds": round(wall, 3),
+        "submissions_per_second": round(len(rows) / wall, 3) if wall else 0.0,
+        "tests_per_second": round(tests_run / wall, 3) if wall else 0.0,
+        "latency_mean": round(sum(latencies) / len(latencies), 4) if latencies else 0.0,
+        "latency_p95": round(_percentile(latencies, 95), 4),
+    }
+
+
+def write_report(path: Path, rows: list[Dict[str, Any]], summary: Dict[str, Any]) -> None:
+    """Write ``rows`` as JSON (``.json``) or CSV (anything else).
+
+    A JSON report carries ``summary`` itself; next to a CSV report it is
+    written to :func:`summary_path`, keeping the CSV one row per submission.
+    """
+    if path.suffix.lower() == ".json":
+        path.write_text(json.dumps({"summary": summary, "results": rows}, indent=2))
+        return
+    with path.open("w", newline="", encoding="utf-8") as fh:
+        writer = csv.DictWriter(fh, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    summary_path(path).write_text(json.dumps(summary, indent=2))
+
+
+def summary_path(report: Path) -> Path:
+    """Where the throughput summary of a CSV ``report`` goes: ``grades.csv`` -> ``grades.summary.json``."""
+    return report.with_name(report.stem + ".summary.json")
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Grade a directory of submissions (<user>.zip / <user>.py) for one task.",
+    )
+    parser.add_argument("task_id", type=int, help="task whose test cases are used")
+    parser.add_argument("submissions", type=Path, help="directory with submission files")
+    parser.add_argument("--db", type=Path, default=Path("database.db"), help="database file")
+    parser.add_argument("--db-profile", choices=sorted(PRAGMA_PROFILES), default=None,
+                        help="database connection profile (default: $PYGRADER_DB_PROFILE or default)")
+    parser.add_argument("--workers", type=int, default=4, help="submissions graded concurrently")
+    parser.add_argument("--backend", choices=RUNNER_BACKENDS, default=None,
+                        help="runner backend (default: $PYGRADER_RUNNER or auto)")
+    parser.add_argument("--timeout", type=int, default=5, help="per-test timeout in seconds")
+    parser.add_argument("--report", type=Path, default=Path("grades.csv"),
+                        help="report file; .json writes JSON, anything else CSV "
+                             "plus a <name>.summary.json with the statistics")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="do not store results in the database")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    if not args.submissions.is_dir():
+        print(f"Not a directory: {args.submissions}", file=sys.stderr)
+        return 2
+
+    with Database(args.db, encryption_key=ENCRYPTION_KEY, profile=args.db_profile) as db:
+        tests = list(db.get_test_cases(args.task_id, lazy=True, with_limits=True))
+        if not tests:
+            print(f"Task {args.task_id} has no test cases", file=sys.stderr)
+            return 2
+        submissions = find_submissions(args.submissions)
+
+        start = time.perf_counter()
+        rows: list[Dict[str, Any]] = []
+        attempts: dict[str, tuple[list[Dict[str, Any]], tuple[str, str] | None]] = {}
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            futures = [
+                pool.submit(grade_submission, path, tests, args.backend, args.timeout)
+                for path in submissions
+            ]
+            for done, future in enumerate(as_completed(futures), 1):
+                row, results, environment = future.result()
+                rows.append(row)
+                attempts[row["submission"]] = (results, environment)
+                print(f"[{done}/{len(futures)}] {row['submission']}: "
+                      f"{row['passed']}/{row['total']} {row['status']}", file=sys.stderr)
+        wall = time.perf_counter() - start
+
+        rows.sort(key=lambda r: r["submission"])
+        for row in rows:
+            row["user_id"] = db.get_user_id(row["user"])
+        progress = [(r["user_id"], r["passed"]) for r in rows
+                    if r["user_id"] is not None and r["status"] == "ok"]
+        stored = 0
+        if not args.dry_run:
+            recorded = []
+            for r in rows:
+                if r["user_id"] is None or r["status"] != "ok":
+                    continue
+                results, (backend, environment) = attempts[r["submission"]]
+                recorded.append((r["user_id"], args.task_id, r["code_hash"], backend,
+                                 results, environment))
+            db.record_submissions(recorded)
+            stored = db.update_task_progress_many(args.task_id, progress)
+
+    summary = summarize(rows, wall)
+    summary["stored"] = stored
+    write_report(args.report, rows, summary)
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
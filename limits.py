@@ -0,0 +1,23 @@
+from typing import NamedTuple
+
+
+class Limits(NamedTuple):
+    """Resource budget of a test case or task.
+
+    ``None`` means "not set here": a test case inherits unset fields from its
+    task (:meth:`over`), and :func:`task_checker.check_solution` falls back to
+    its ``timeout`` for the wall time.
+    """
+
+    time: float | None = None       # wall-clock seconds
+    cpu: float | None = None        # CPU seconds (user + system)
+    memory_kb: int | None = None    # peak resident set size
+
+    def over(self, base: "Limits | None") -> "Limits":
+        """Return these limits with unset fields taken from ``base``."""
+        if base is None:
+            return self
+        return Limits(*(own if own is not None else inherited for own, inherited in zip(self, base)))
+
+    def is_set(self) -> bool:
+        return any(value is not None for value in self)
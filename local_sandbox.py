@@ -0,0 +1,430 @@
+"""Resource isolation for solutions run directly on the host.
+
+When Docker is unavailable :class:`docker_runner.DockerTaskRunner` falls back
+to running solutions as local processes. :class:`LocalSandbox` confines such
+a process the way the container would be confined:
+
+* ``cpu_limit``, ``mem_limit`` and ``pids_limit`` become ``RLIMIT_CPU``,
+  ``RLIMIT_AS`` and ``RLIMIT_NPROC``; files are capped with ``RLIMIT_FSIZE``
+  and core dumps are disabled. The limits are handed to the run's
+  :mod:`sandbox_harness` (see :data:`sandbox_harness.RLIMITS_ENV`), which
+  applies them itself, so no ``preexec_fn`` runs in this multi-threaded
+  process. ``RLIMIT_NPROC`` does not bind root, so a grader running as root
+  only limits processes with a cgroup;
+* the run starts a new session, and its harness is a child subreaper that
+  adopts whatever a solution leaves behind. On timeout every descendant of
+  the harness and every member of its session is killed;
+* with a delegated cgroup v2 directory (``PYGRADER_CGROUP_ROOT``) every run
+  also gets its own cgroup with ``cpu.max``, ``memory.max`` and
+  ``pids.max``, which enforce the limits exactly, and ``cgroup.kill`` stops
+  the run even if a solution managed to escape both the tree and the session.
+"""
+import itertools
+import json
+import math
+import os
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from limits import Limits
+from logger import log
+from sandbox_harness import MAX_OUTPUT, RLIMITS_ENV, cap_output, usage_record
+
+# delegated cgroup v2 directory that may hold one child cgroup per run
+CGROUP_ROOT = os.environ.get("PYGRADER_CGROUP_ROOT")
+# address space an interpreter maps beyond its resident memory (libraries,
+# thread stacks, allocator arenas); added to every RLIMIT_AS budget
+AS_HEADROOM = 64 * 1024 * 1024
+
+_UNITS = {"b": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+_CPU_PERIOD = 100000
+_run_ids = itertools.count()
+
+
+def parse_size(value: str | int | None) -> int | None:
+    """Bytes in a Docker style size such as ``"512m"``; ints and ``None`` pass through."""
+    if value is None or isinstance(value, int):
+        return value
+    text = value.strip().lower()
+    if len(text) > 1 and text.endswith("b") and text[-2] in _UNITS:
+        text = text[:-1]
+    if text and text[-1] in _UNITS:
+        return int(float(text[:-1]) * _UNITS[text[-1]])
+    return int(text)
+
+
+def _user_tasks() -> int | None:
+    """Processes and threads of the current user, as ``RLIMIT_NPROC`` counts them."""
+    uid = os.getuid()
+    count = 0
+    try:
+        pids = [name for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return None
+    for pid in pids:
+        try:
+            if os.stat(f"/proc/{pid}").st_uid == uid:
+                count += len(os.listdir(f"/proc/{pid}/task"))
+        except OSError:  # exited meanwhile
+            pass
+    return count
+
+
+def _process_table() -> list[tuple[int, int, int]]:
+    """``(pid, ppid, session)`` of every live (not yet exited) process, read from ``/proc``."""
+    table = []
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat", "rb") as fh:
+                # fields after the command: state, ppid, pgrp, session, ...
+                fields = fh.read().rsplit(b")", 1)[1].split()
+        except OSError:  # exited meanwhile
+            continue
+        if fields[0] != b"Z":  # zombies wait for a (maybe stopped) parent to reap them
+            table.append((int(name), int(fields[1]), int(fields[3])))
+    return table
+
+
+def _tree_members(root: int, *, descendants: bool = True) -> set[int]:
+    """Members of ``root``'s session and (with ``descendants``) processes below it, without ``root``."""
+    table = _process_table()
+    members = {pid for pid, _, sid in table if sid == root}
+    if descendants:
+        children: dict[int, list[int]] = {}
+        for pid, ppid, _ in table:
+            children.setdefault(ppid, []).append(pid)
+        todo = [root]
+        while todo:
+            for child in children.get(todo.pop(), ()):
+                if child not in members:
+                    members.add(child)
+                    todo.append(child)
+    members.discard(root)
+    return members
+
+
+def _signal(pid: int) -> None:
+    try:
+        os.kill(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _kill_tree(root: int, *, reaped: bool = False) -> None:
+    """SIGKILL ``root`` (a session leader) and every process below it or in its session.
+
+    ``root`` is a child subreaper, so while it lives anything a solution
+    started stays below it; it is therefore killed last. Once ``root`` has
+    been reaped (``reaped=True``) its pid may belong to an unrelated process,
+    so neither it nor processes found by parent are touched; only members of
+    its session are, which keep the session id from being reused.
+    """
+    if not os.path.isdir("/proc"):
+        try:
+            os.killpg(root, signal.SIGKILL)  # only the leader's process group can be reached
+        except (ProcessLookupError, PermissionError):
+            pass
+        return
+    # members may still be forking while we look; repeat until none is left
+    for _ in range(100):
+        members = _tree_members(root, descendants=not reaped)
+        if not members:
+            break
+        for pid in members:
+            _signal(pid)
+    else:
+        log.warning("Processes of run %d kept appearing while it was being killed", root)
+    if reaped:
+        return
+    _signal(root)
+    for pid in _tree_members(root):  # anything orphaned in the session meanwhile
+        _signal(pid)
+
+
+class _Cgroup:
+    """Per-run cgroup v2 directory with CPU, memory and process limits."""
+
+    __slots__ = ("path",)
+
+    def __init__(self, root: Path, cpu_limit: float | None, memory: int | None, pids: int | None):
+        self.path = root / f"run-{os.getpid()}-{next(_run_ids)}"
+        self.path.mkdir()
+        settings = {
+            "cpu.max": f"{int(cpu_limit * _CPU_PERIOD)} {_CPU_PERIOD}" if cpu_limit else None,
+            "memory.max": memory,
+            "memory.swap.max": 0 if memory else None,
+            "pids.max": pids,
+        }
+        try:
+            for name, value in settings.items():
+                # a file only exists if its controller is enabled for the root
+                if value is not None and (self.path / name).exists():
+                    (self.path / name).write_text(str(value))
+        except OSError:
+            self.path.rmdir()
+            raise
+
+    def add(self, pid: int) -> None:
+        """Move process ``pid`` into the cgroup."""
+        (self.path / "cgroup.procs").write_text(str(pid))
+
+    def kill(self) -> None:
+        try:
+            (self.path / "cgroup.kill").write_text("1")
+            return
+        except OSError:  # kernels before 5.14
+            pass
+        try:
+            pids = (self.path / "cgroup.procs").read_text().split()
+        except OSError:
+            return
+        for pid in pids:
+            try:
+                os.kill(int(pid), signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def remove(self) -> None:
+        self.kill()
+        # killed processes leave the cgroup asynchronously (a fork bomb takes a while)
+        for _ in range(500):
+            try:
+                self.path.rmdir()
+                return
+            except FileNotFoundError:
+                return
+            except OSError:
+                time.sleep(0.01)
+        log.warning("Could not remove cgroup %s", self.path)
+
+
+class LocalSandbox:
+    """Run solutions as host processes under container-like limits.
+
+    Parameters
+    ----------
+    cpu_limit: float
+        CPU share of a run, as for ``docker run --cpus``. Without cgroups it
+        bounds the total CPU time to ``cpu_limit * timeout`` seconds.
+    mem_limit: str | int
+        Memory of a run, as for ``docker run --memory``.
+    pids_limit: int
+        Processes and threads a run may create.
+    file_size_limit: str | int | None
+        Largest file (including the redirected output) a run may write.
+    cgroup_root: str | Path | None
+        Delegated cgroup v2 directory for per-run cgroups; ``None`` uses
+        rlimits only.
+    """
+
+    def __init__(self,
+                 *,
+                 cpu_limit: float = 0.5,
+                 mem_limit: str | int = "512m",
+                 pids_limit: int = 64,
+                 file_size_limit: str | int | None = "64m",
+                 cgroup_root: str | Path | None = CGROUP_ROOT):
+        self.cpu_limit = cpu_limit
+        self.mem_limit = parse_size(mem_limit)
+        self.pids_limit = pids_limit
+        self.file_size_limit = parse_size(file_size_limit)
+        self.cgroup_root = Path(cgroup_root) if cgroup_root else None
+        if self.cgroup_root is not None and not (
+            (self.cgroup_root / "cgroup.procs").exists() and os.access(self.cgroup_root, os.W_OK)
+        ):
+            log.warning("%s is not a writable cgroup v2 directory; using rlimits only",
+                        self.cgroup_root)
+            self.cgroup_root = None
+        self.posix = os.name == "posix" and resource is not None
+        if self.posix and pids_limit and os.getuid() == 0 and self.cgroup_root is None:
+            log.warning("Running as root: RLIMIT_NPROC does not apply, so pids_limit=%d is "
+                        "not enforced without a cgroup (set PYGRADER_CGROUP_ROOT)", pids_limit)
+
+    def fingerprint(self) -> str:
+        return f"{self.cpu_limit}:{self.mem_limit}:{self.pids_limit}:{self.file_size_limit}"
+
+    def _rlimits(self, timeout: float, limits: Limits, file_size: int | None) -> dict:
+        """``{"RLIMIT_...": (soft, hard)}`` of one run, computed before it starts."""
+        rlimits = {"RLIMIT_CORE": (0, 0)}
+        cpu = [limits.cpu] if limits.cpu else []
+        if self.cpu_limit:
+            cpu.append(self.cpu_limit * timeout)
+        if cpu:
+            soft = max(1, math.ceil(min(cpu)))
+            rlimits["RLIMIT_CPU"] = (soft, soft + 1)
+        memory = [self.mem_limit] if self.mem_limit else []
+        if limits.memory_kb:
+            memory.append(limits.memory_kb * 1024)
+        if memory:
+            cap = min(memory) + AS_HEADROOM
+            rlimits["RLIMIT_AS"] = (cap, cap)
+        if file_size:
+            rlimits["RLIMIT_FSIZE"] = (file_size, file_size)
+        if self.pids_limit and hasattr(resource, "RLIMIT_NPROC") and os.getuid() != 0:
+            # the limit counts every task of the user, not just this run's
+            tasks = _user_tasks()
+            if tasks is not None:
+                rlimits["RLIMIT_NPROC"] = (tasks + self.pids_limit,) * 2
+        return rlimits
+
+    @contextmanager
+    def session(self, timeout: float, limits: Limits | None = None, *, limit_files: bool = True):
+        """Confine one harness run: yield ``(popen_kwargs, start, kill)``.
+
+        ``popen_kwargs`` (a new session, a stdin pipe and the rlimits in the
+        environment) are meant for ``subprocess.Popen`` or
+        ``asyncio.create_subprocess_exec`` of :mod:`sandbox_harness`. Once
+        the process exists call ``start(pid)``, which moves it into the run's
+        cgroup, and then close its stdin to let the harness begin.
+        ``kill(pid)`` stops every process of the run; pass ``reaped=True``
+        once ``pid`` has been waited for, when only its session can still be
+        matched safely. The run's cgroup is removed on exit.
+        """
+        if not self.posix:
+            yield {}, lambda pid: None, lambda pid: os.kill(pid, signal.SIGTERM)
+            return
+        cgroup = None
+        if self.cgroup_root is not None:
+            try:
+                cgroup = _Cgroup(self.cgroup_root, self.cpu_limit, self.mem_limit, self.pids_limit)
+            except OSError as exc:
+                log.warning("Could not create a cgroup under %s: %s", self.cgroup_root, exc)
+        file_size = self.file_size_limit if limit_files else None
+        rlimits = self._rlimits(timeout, limits or Limits(), file_size)
+
+        def start(pid: int) -> None:
+            if cgroup is not None:
+                try:
+                    cgroup.add(pid)
+                except OSError as exc:  # rlimits still apply
+                    log.warning("Could not move run %d into %s: %s", pid, cgroup.path, exc)
+
+        def kill(pid: int, *, reaped: bool = False) -> None:
+            if cgroup is not None:
+                cgroup.kill()
+            _kill_tree(pid, reaped=reaped)
+
+        confine = {
+            "start_new_session": True,
+            "stdin": subprocess.PIPE,
+            "env": {**os.environ, RLIMITS_ENV: json.dumps(rlimits)},
+        }
+        try:
+            yield confine, start, kill
+        finally:
+            if cgroup is not None:
+                cgroup.remove()
+
+    def run(self, workdir: str, entry: str, args: list[str], timeout: float, *,
+            limits: Limits | None = None,
+            track: Callable[[Callable[[], None]], Any] | None = None,
+            max_output: int | None = MAX_OUTPUT) -> Dict[str, Any]:
+        """Run ``python entry *args`` (the staged harness) in ``workdir``; return its execution record.
+
+        ``track(kill)`` is entered for the duration of the run, with ``kill``
+        stopping the whole process tree. A run that exceeds ``timeout`` is
+        killed and reported with ``timed_out`` set. With ``max_output=None``
+        (the batch harness, which caps its cases itself) the output file is
+        not size limited. Linux keeps a process's peak RSS across ``exec``, so
+        ``memory_kb`` includes the RSS of this (forking) process.
+        """
+        if not self.posix:
+            return self._run_plain(workdir, entry, args, timeout, track, max_output)
+
+        expired = threading.Event()
+        # output goes to a file so a chatty solution cannot fill our memory
+        with self.session(timeout, limits, limit_files=max_output is not None) as (confine, begin, kill_tree), \
+                tempfile.TemporaryFile() as out:
+            start = time.perf_counter()
+            with subprocess.Popen(
+                ["python", entry, *args],
+                cwd=workdir,
+                stdout=out,
+                stderr=subprocess.STDOUT,
+                **confine,
+            ) as proc:
+                begin(proc.pid)
+                proc.stdin.close()
+
+                def kill() -> None:
+                    kill_tree(proc.pid)
+
+                def expire() -> None:
+                    expired.set()
+                    kill()
+
+                timer = threading.Timer(timeout, expire)
+                timer.start()
+                try:
+                    with track(kill) if track else nullcontext():
+                        # wait without reaping: the zombie keeps its pid from being reused
+                        os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+                        # background children of the solution must not outlive the run
+                        kill()
+                finally:
+                    timer.cancel()
+                    timer.join()
+                _, wait_status, usage = os.wait4(proc.pid, 0)
+                proc.returncode = os.waitstatus_to_exitcode(wait_status)
+            elapsed = time.perf_counter() - start
+            out.seek(0)
+            output, truncated = cap_output(
+                out.read() if max_output is None else out.read(max_output + 1), max_output
+            )
+        return {
+            "status": proc.returncode,
+            "output": output,
+            "truncated": truncated,
+            "elapsed": elapsed,
+            "timed_out": expired.is_set(),
+            **usage_record(usage),
+            "stats": None,
+        }
+
+    @staticmethod
+    def _run_plain(workdir: str, entry: str, args: list[str], timeout: float,
+                   track, max_output: int | None) -> Dict[str, Any]:
+        """Fallback without rlimits or ``wait4`` (Windows)."""
+        with tempfile.TemporaryFile() as out:
+            start = time.perf_counter()
+            with subprocess.Popen(
+                ["python", entry, *args],
+                cwd=workdir,
+                stdin=subprocess.DEVNULL,
+                stdout=out,
+                stderr=subprocess.STDOUT,
+            ) as proc, (track(proc.kill) if track else nullcontext()):
+                try:
+                    proc.wait(timeout=timeout)
+                    timed_out = False
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    proc.wait()
+                    timed_out = True
+            elapsed = time.perf_counter() - start
+            out.seek(0)
+            output, truncated = cap_output(
+                out.read() if max_output is None else out.read(max_output + 1), max_output
+            )
+        return {
+            "status": proc.returncode,
+            "output": output,
+            "truncated": truncated,
+            "elapsed": elapsed,
+            "timed_out": timed_out,
+            **usage_record(None),
+            "stats": None,
+        }
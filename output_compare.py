@@ -0,0 +1,100 @@
+"""Streamed comparison of a program's output with the expected answer.
+
+:func:`compare_output` implements the grading rule ``output.strip() ==
+expected`` without building stripped copies: both sides are consumed chunk
+by chunk (the expected side may be a :class:`blob_store.BlobRef`) and the
+comparison stops at the first difference, which is reported by position.
+
+Sandbox runs only report a preview of the output together with the digest
+of its stripped text (:func:`sandbox_harness.stripped_digest`); a run passes
+when that digest equals :func:`text_digest` of the expected output. Given
+the expected output the harness also reports where the whole output first
+differs from it, which :func:`locate` turns into a :class:`Comparison`.
+"""
+import hashlib
+from typing import Iterable, Iterator, NamedTuple
+
+# EXCERPT: characters of context reported on each side of a difference
+from sandbox_harness import EXCERPT, first_difference
+
+# slice size used when a plain string is consumed as a stream
+_SLICE = 1 << 16
+
+
+class Comparison(NamedTuple):
+    """Outcome of :func:`compare_output`; positions refer to the expected output."""
+
+    passed: bool
+    offset: int | None = None   # 0-based character offset of the first difference
+    line: int | None = None     # 1-based
+    column: int | None = None   # 1-based
+    expected: str = ""          # expected text from the difference on
+    got: str = ""               # program output from the difference on
+
+
+def _chunks(value) -> Iterator[str]:
+    if isinstance(value, str):
+        for start in range(0, len(value), _SLICE):
+            yield value[start:start + _SLICE]
+    elif hasattr(value, "chunks"):
+        yield from value.chunks()
+    else:
+        yield from value
+
+
+def compare_output(output: str | Iterable[str], expected) -> Comparison:
+    """Check ``output.strip() == expected`` incrementally.
+
+    ``output`` and ``expected`` may be strings, iterables of string chunks or
+    objects with a ``chunks()`` method. Reading stops at the first difference.
+    """
+    found = first_difference(_chunks(output), _chunks(expected))
+    return Comparison(True) if found is None else locate(expected, *found)
+
+
+def locate(expected, offset: int, got: str) -> Comparison:
+    """The failed :class:`Comparison` for a difference at character ``offset`` of ``expected``.
+
+    ``got`` is the program output from the difference on, for instance as
+    reported by the sandbox harness. ``expected`` is read up to the excerpt.
+    """
+    line, column, seen, excerpt = 1, 1, 0, ""
+    for chunk in _chunks(expected):
+        if seen < offset:
+            part = chunk[:offset - seen]
+            newlines = part.count("\n")
+            if newlines:
+                line += newlines
+                column = len(part) - part.rfind("\n")
+            else:
+                column += len(part)
+            seen += len(part)
+            chunk = chunk[len(part):]
+        if seen >= offset:
+            excerpt += chunk
+            if len(excerpt) >= EXCERPT:
+                break
+    return Comparison(False, offset, line, column, excerpt[:EXCERPT], got[:EXCERPT])
+
+
+def text_digest(value) -> str:
+    """SHA-256 of ``value`` (a string or chunked handle) in UTF-8, read chunk by chunk."""
+    digest = hashlib.sha256()
+    for chunk in _chunks(value):
+        digest.update(chunk.encode())
+    return digest.hexdigest()
+
+
+def write_text(value, path) -> None:
+    """Write ``value`` (a string or chunked handle) to ``path`` in UTF-8, chunk by chunk."""
+    with open(path, "w", encoding="utf-8", newline="") as fh:
+        for chunk in _chunks(value):
+            fh.write(chunk)
+
+
+def preview(value, limit: int = EXCERPT * 5) -> str:
+    """Return at most ``limit`` characters of ``value`` (a string or blob handle)."""
+    if isinstance(value, str):
+        return value if len(value) <= limit else value[:limit] + "…"
+    head = next(_chunks(value), "")
+    return head[:limit] + "…" if len(head) > limit or getattr(value, "size", 0) > limit else head
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import threading
+import weakref
+import zipfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from logger import log
+
+
+def normalize_source(code: str) -> str:
+    """Normalise line endings so the same file saved on another OS hashes identically.
+
+    Nothing else is touched: trailing spaces can be significant inside
+    multi-line strings or after a backslash continuation.
+    """
+    return code.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def source_digest(code: str | None = None, archive: str | Path | None = None) -> str:
+    """Return a digest of the submitted solution.
+
+    Inline code is normalised first; archives are hashed by member name and
+    content (in name order) so that re-zipping the same files is a hit.
+    """
+    h = hashlib.sha256()
+    if code is not None:
+        h.update(b"code\0")
+        h.update(normalize_source(code).encode())
+        return h.hexdigest()
+
+    h.update(b"archive\0")
+    with zipfile.ZipFile(archive) as zf:
+        for info in sorted(zf.infolist(), key=lambda i: i.filename):
+            if info.is_dir():
+                continue
+            h.update(info.filename.encode() + b"\0")
+            with zf.open(info) as member:
+                for chunk in iter(lambda: member.read(1 << 16), b""):
+                    h.update(chunk)
+            h.update(b"\0")
+    return h.hexdigest()
+
+
+def _payload_key(value) -> str:
+    blob = getattr(value, "digest", None)
+    return f"blob:{blob}" if isinstance(blob, str) else str(value)
+
+
+class ResultCache:
+    """LRU cache of per-test grading results.
+
+    Entries are keyed by :meth:`key` – solution digest, test input, expected
+    output, runner fingerprint and timeout – and evicted least recently used
+    first once ``max_entries`` or ``max_bytes`` (approximate JSON size) is
+    exceeded. When a :class:`database.Database` is given, entries are also
+    persisted in its ``ResultCache`` table and read back on a memory miss.
+    The table is cut back to the ``max_rows`` newest entries when the cache
+    is created and after every ``prune_every`` writes, so it never holds
+    more than ``max_rows + prune_every`` rows.
+    """
+
+    def __init__(self, max_entries: int = 4096, max_bytes: int = 32 * 1024 * 1024, db=None, *,
+                 max_rows: int = 10000, prune_every: int = 256):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.db = db
+        self.max_rows = max_rows
+        self.prune_every = prune_every
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[Dict[str, Any], int]] = OrderedDict()
+        self._size = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        if db is not None:
+            self._prune()
+
+    def _prune(self) -> None:
+        try:
+            self.db.prune_result_cache(self.max_rows, wait=False)
+        except Exception as exc:
+            log.warning("Result cache pruning failed: %s", exc)
+
+    @staticmethod
+    def key(digest: str, inp, expected, fingerprint: str, timeout: float) -> str:
+        # blob-backed test payloads are keyed by their content digest, not read
+        payload = json.dumps([digest, _payload_key(inp), _payload_key(expected), fingerprint, timeout])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry[0])
+
+        record = None
+        if self.db is not None:
+            try:
+                payload = self.db.get_cached_result(key)
+            except Exception as exc:
+                log.warning("Result cache lookup failed: %s", exc)
+                payload = None
+            if payload is not None:
+                record = json.loads(payload)
+                self._remember(key, record, len(payload))
+
+        with self._lock:
+            if record is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return record
+
+    def put(self, key: str, record: Dict[str, Any]) -> None:
+        payload = json.dumps(record)
+        self._remember(key, record, len(payload))
+        if self.db is not None:
+            try:
+                self.db.put_cached_result(key, payload)
+            except Exception as exc:
+                log.warning("Result cache write failed: %s", exc)
+                return
+            with self._lock:
+                self._writes += 1
+                due = self._writes % self.prune_every == 0
+            if due:
+                self._prune()
+
+    def _remember(self, key: str, record: Dict[str, Any], size: int) -> None:
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[key] = (dict(record), size)
+            self._size += size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_SHARED: "weakref.WeakKeyDictionary[Any, ResultCache]" = weakref.WeakKeyDictionary()
+_MEMORY_ONLY: Optional[ResultCache] = None
+_SHARED_LOCK = threading.Lock()
+
+
+def shared_cache(db=None) -> ResultCache:
+    """Return the process-wide cache bound to ``db`` (or the memory-only one)."""
+    global _MEMORY_ONLY
+    with _SHARED_LOCK:
+        if db is None:
+            if _MEMORY_ONLY is None:
+                _MEMORY_ONLY = ResultCache()
+            return _MEMORY_ONLY
+        cache = _SHARED.get(db)
+        if cache is None:
+            cache = _SHARED[db] = ResultCache(db=db)
+        return cache
@@ -0,0 +1,80 @@
+"""Deadline enforcement for blocking Docker calls.
+
+A Docker call such as ``container.wait()`` or reading an exec stream blocks
+until the solution ends, so a hanging program would stall the grading
+thread. :class:`Watchdog` stops the run once its deadline passes (and
+escalates if stopping does not help), while :func:`read_bounded` keeps at
+most a fixed amount of the output that was produced until then.
+"""
+import threading
+import time
+from typing import Callable, Iterable
+
+from logger import log
+
+# seconds a stopped run may take to wind down before the watchdog escalates
+GRACE = 2.0
+
+
+class Watchdog:
+    """Call ``stop`` once ``timeout`` seconds pass, unless the block exits first.
+
+    Use as a context manager around the blocking call. If the block is still
+    running ``grace`` seconds after ``stop``, ``escalate`` is called as well.
+    Afterwards ``fired`` tells whether the deadline was hit and ``elapsed``
+    holds the wall time spent in the block.
+    """
+
+    def __init__(self, timeout: float, stop: Callable[[], None], *,
+                 escalate: Callable[[], None] | None = None, grace: float = GRACE):
+        self.timeout = timeout
+        self.stop = stop
+        self.escalate = escalate
+        self.grace = grace
+        self.fired = False
+        self.elapsed: float | None = None
+        self._done = threading.Event()
+        self._start = 0.0
+
+    def _call(self, action: Callable[[], None]) -> None:
+        try:
+            action()
+        except Exception as exc:  # the run may have ended meanwhile
+            log.debug("Watchdog action failed: %s", exc)
+
+    def _watch(self) -> None:
+        if self._done.wait(self.timeout):
+            return
+        self.fired = True
+        self._call(self.stop)
+        if self.escalate is not None and not self._done.wait(self.grace):
+            log.warning("Run did not stop %.1fs after its deadline; escalating", self.grace)
+            self._call(self.escalate)
+
+    def __enter__(self) -> "Watchdog":
+        self._start = time.perf_counter()
+        threading.Thread(target=self._watch, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.elapsed = time.perf_counter() - self._start
+        self._done.set()
+
+
+def read_bounded(chunks: Iterable[bytes], limit: int | None) -> tuple[bytes, bool]:
+    """Join ``chunks`` keeping at most ``limit`` bytes (all if ``None``).
+
+    The rest of the stream is still consumed, so the producer never blocks on
+    a full pipe; the flag tells whether anything was dropped.
+    """
+    kept: list[bytes] = []
+    size = 0
+    dropped = False
+    for chunk in chunks:
+        if limit is not None and size + len(chunk) > limit:
+            chunk = chunk[:max(0, limit - size)]
+            dropped = True
+        if chunk:
+            kept.append(chunk)
+            size += len(chunk)
+    return b"".join(kept), dropped
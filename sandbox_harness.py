@@ -0,0 +1,692 @@
+"""In-sandbox harness that runs every test case of a submission in one session.
+
+This file is copied next to the solution and executed inside the sandbox::
+
+    python _pygrader_harness.py ENTRY CASES_JSON
+
+It also doubles as the long-lived fork server ("zygote") of the local
+backend, started as ``python sandbox_harness.py --serve [MODULE ...]``.
+
+``CASES_JSON`` holds a list of ``{"args": [...], "timeout": seconds}``
+objects, optionally with ``cpu_limit`` (seconds), ``memory_kb`` and
+``file_size`` (bytes) budgets and ``expected``, the name of a UTF-8 file with
+the expected output. Each case is run in a forked child of the already initialised
+interpreter (or a fresh ``python`` process where ``fork`` is unavailable), so
+cases stay isolated from each other without paying interpreter start-up per
+test. The harness reports ``status``, ``output``, ``tail``, ``size``,
+``digest``, ``elapsed``, ``cpu_time``, ``memory_kb``, ``timed_out`` and
+``truncated`` for every case (see :func:`summarize_output`). A case's output
+goes to a file and is never held whole: the report carries its first
+:data:`PREVIEW_OUTPUT` and last :data:`TAIL_OUTPUT` bytes plus a digest of
+the stripped text, which the grader compares with the digest of the expected
+output. Given the expected output, the harness also streams the whole output
+against it and reports where they first differ (``difference``, see
+:func:`first_difference`), however far beyond the preview that is. CPU time and peak RSS come from ``wait4`` and are ``None`` where
+``fork`` is unavailable.
+
+The report is the only thing the harness writes to its stdout: one frame
+(see :func:`write_report`) read back with :func:`parse_report`. Right after
+start-up the harness points its own stdout and stderr at ``/dev/null`` and
+keeps the report on a private descriptor that children close, and it marks
+itself non-dumpable so that solutions running as the same (non-root) user
+can reach neither that descriptor through ``/proc`` nor the harness's memory.
+
+On Linux the harness is a child subreaper: processes a solution leaves behind
+(even after ``setsid`` or a double fork) become children of the harness, which
+kills them after every case. Session-wide rlimits handed over in
+:data:`RLIMITS_ENV` are applied at start-up, and a batch run reads its stdin
+to EOF before the first case so that the host can finish confining it (for
+instance move it into a cgroup) first.
+
+Only the standard library may be used here – the sandbox image is a plain
+Python installation.
+"""
+import atexit
+import codecs
+import hashlib
+import io
+import itertools
+import json
+import math
+import os
+import pkgutil  # noqa: F401 - imported lazily by runpy.run_path; load once, not per child
+import runpy
+import select
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# first bytes of a report frame, followed by the payload length and a newline
+RESULT_MARKER = "__PYGRADER_RESULTS__"
+MAX_FD = os.sysconf("SC_OPEN_MAX") if hasattr(os, "sysconf") else 256
+# bytes of a run's output that are kept; anything beyond marks the record truncated
+MAX_OUTPUT = 16 * 1024 * 1024
+# bytes of a case's output reported from its start, and from its end when it is longer
+PREVIEW_OUTPUT = 64 * 1024
+TAIL_OUTPUT = 4 * 1024
+# characters of the output reported from a difference on
+EXCERPT = 40
+# environment variable with ``{"RLIMIT_...": [soft, hard]}`` for the whole session
+RLIMITS_ENV = "PYGRADER_RLIMITS"
+
+_PR_SET_DUMPABLE = 4
+_PR_SET_CHILD_SUBREAPER = 36
+
+
+def cap_output(data: bytes, limit: int | None = MAX_OUTPUT) -> tuple[str, bool]:
+    """Decode at most ``limit`` bytes (all if ``None``); also report whether more were given."""
+    if limit is None or len(data) <= limit:
+        return data.decode(errors="replace"), False
+    return data[:limit].decode(errors="replace"), True
+
+
+def stripped_digest(chunks) -> str:
+    """SHA-256 of ``b"".join(chunks).decode(errors="replace").strip()`` in UTF-8, computed incrementally."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    digest = hashlib.sha256()
+    clean = digest.copy()  # state at the end of the last non-whitespace text
+    started = False
+    for chunk in itertools.chain(chunks, [None]):  # None: flush the decoder
+        text = decoder.decode(b"", final=True) if chunk is None else decoder.decode(chunk)
+        if not started:
+            text = text.lstrip()
+            if not text:
+                continue
+            started = True
+        body = text.rstrip()
+        if body:
+            digest.update(body.encode())
+            clean = digest.copy()
+            text = text[len(body):]
+        digest.update(text.encode())
+    return clean.hexdigest()
+
+
+def _decoded(fh):
+    """The UTF-8 text of the binary file ``fh`` as string chunks, read from its start."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    fh.seek(0)
+    for chunk in iter(lambda: fh.read(1 << 16), b""):
+        yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
+
+
+class _Cursor:
+    """Reads a stream of string chunks on demand, counting the characters consumed."""
+
+    __slots__ = ("_chunks", "_buf", "offset", "last")
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buf = ""
+        self.offset = 0
+        self.last = ""
+
+    def peek(self, n: int) -> str:
+        while len(self._buf) < n:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buf += chunk
+        return self._buf[:n]
+
+    def advance(self, n: int) -> None:
+        seg, self._buf = self._buf[:n], self._buf[n:]
+        if seg:
+            self.offset += len(seg)
+            self.last = seg[-1]
+
+
+def first_difference(output, expected) -> tuple[int, str] | None:
+    """Where ``"".join(output).strip()`` first differs from ``"".join(expected)``.
+
+    Both are iterables of string chunks and are read only up to the
+    difference. Returns ``None`` when they are equal, otherwise the offset
+    into the expected text and up to :data:`EXCERPT` characters of the
+    output from there on.
+    """
+    exp = _Cursor(expected)
+    started = False
+    for chunk in output:
+        if not started:
+            chunk = chunk.lstrip()
+            if not chunk:
+                continue
+            started = True
+        pos = 0
+        while pos < len(chunk):
+            want = exp.peek(len(chunk) - pos)
+            if not want:
+                # expected output is exhausted: only trailing whitespace may follow
+                rest = chunk[pos:]
+                if rest.strip():
+                    return exp.offset, rest[:EXCERPT]
+                break
+            got = chunk[pos:pos + len(want)]
+            if got != want:
+                i = next(i for i, (a, b) in enumerate(zip(got, want)) if a != b)
+                exp.advance(i)
+                return exp.offset, got[i:i + EXCERPT]
+            exp.advance(len(want))
+            pos += len(want)
+
+    if exp.peek(1):
+        return exp.offset, ""  # output ended early
+    if exp.last.isspace():
+        # expected ends with whitespace, which a stripped output never has
+        return exp.offset, ""
+    return None
+
+
+def summarize_output(fh, expected: str | None = None) -> dict:
+    """Report fields for the output in the binary file ``fh``, read in bounded chunks.
+
+    ``output`` and ``tail`` hold the first :data:`PREVIEW_OUTPUT` and (when
+    there is more) the last :data:`TAIL_OUTPUT` bytes, ``size`` the byte count,
+    ``truncated`` whether ``output`` is shorter than the whole, and ``digest``
+    the :func:`stripped_digest` of everything. With the path of the
+    ``expected`` output, ``difference`` is ``None`` when the output matches it
+    and ``{"offset", "got"}`` from :func:`first_difference` otherwise.
+    """
+    size = fh.seek(0, os.SEEK_END)
+    fh.seek(0)
+    head = fh.read(PREVIEW_OUTPUT)
+    fh.seek(0)
+    digest = stripped_digest(iter(lambda: fh.read(1 << 16), b""))
+    tail = b""
+    if size > PREVIEW_OUTPUT:
+        fh.seek(max(PREVIEW_OUTPUT, size - TAIL_OUTPUT))
+        tail = fh.read(TAIL_OUTPUT)
+    record = {"output": head.decode(errors="replace"), "tail": tail.decode(errors="replace"),
+              "size": size, "truncated": size > PREVIEW_OUTPUT, "digest": digest}
+    if expected is not None:
+        with open(expected, "rb") as want:
+            found = first_difference(_decoded(fh), _decoded(want))
+        record["difference"] = None if found is None else {"offset": found[0], "got": found[1]}
+    return record
+
+
+def report_limit(cases: int) -> int:
+    """Upper bound on the size of a report frame for ``cases`` cases."""
+    # JSON may escape a byte of output to six characters (\u00XX), a character
+    # of an excerpt (up to four bytes) to twelve (a surrogate pair)
+    return 64 * 1024 + cases * (6 * (PREVIEW_OUTPUT + TAIL_OUTPUT) + 12 * EXCERPT + 1024)
+
+
+def usage_record(usage, baseline_kb: int = 0) -> dict:
+    """``cpu_time`` (seconds) and ``memory_kb`` from a ``struct_rusage``.
+
+    ``memory_kb`` is the peak RSS minus ``baseline_kb``, the resident memory
+    the process had before the solution started.
+    """
+    if usage is None:
+        return {"cpu_time": None, "memory_kb": None}
+    peak = usage.ru_maxrss
+    if sys.platform == "darwin":  # bytes there, KiB on Linux
+        peak //= 1024
+    return {"cpu_time": usage.ru_utime + usage.ru_stime, "memory_kb": max(0, peak - baseline_kb)}
+
+
+def _peak_kb() -> int:
+    """Peak RSS of this process so far in KiB."""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _address_space() -> int | None:
+    """Current virtual memory size of this process in bytes (Linux only)."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def lower_rlimit(which: int, soft: int, hard: int | None = None) -> None:
+    """Set an rlimit, clamped to the hard limit already in force (which cannot be raised)."""
+    hard = soft if hard is None else hard
+    _, current = resource.getrlimit(which)
+    if current != resource.RLIM_INFINITY:
+        hard = min(hard, current)
+    resource.setrlimit(which, (min(soft, hard), hard))
+
+
+def apply_limits(cpu_limit: float | None = None, memory_kb: int | None = None,
+                 file_size: int | None = None) -> None:
+    """Apply a test's CPU and memory budget to the current process via rlimits.
+
+    Exceeding ``cpu_limit`` seconds of CPU ends the process with ``SIGXCPU``.
+    Memory is capped at ``memory_kb`` beyond what the interpreter has already
+    mapped, so allocations past the budget raise ``MemoryError``; the verdict
+    itself is judged on the peak RSS beyond what the child was forked with.
+    Files (including redirected output) may not grow past ``file_size`` bytes
+    (``SIGXFSZ``).
+    """
+    if resource is None:
+        return
+    if cpu_limit:
+        soft = max(1, math.ceil(cpu_limit))
+        lower_rlimit(resource.RLIMIT_CPU, soft, soft + 1)
+    if memory_kb:
+        base = _address_space()
+        if base is not None:
+            cap = base + memory_kb * 1024
+            lower_rlimit(resource.RLIMIT_AS, cap)
+    if file_size:
+        lower_rlimit(resource.RLIMIT_FSIZE, file_size)
+
+
+def write_report(stream, payload) -> None:
+    """Write ``payload`` as one frame: ``RESULT_MARKER LENGTH\\n`` and ASCII JSON."""
+    data = json.dumps(payload).encode("ascii")
+    stream.write(f"{RESULT_MARKER} {len(data)}\n".encode("ascii") + data)
+    stream.flush()
+
+
+def parse_report(text: str):
+    """Payload of the frame ``text`` consists of; ``ValueError`` unless it is exactly one frame.
+
+    A payload of the form ``{"error": ...}`` is the harness reporting its own failure.
+    """
+    header, newline, data = text.partition("\n")
+    marker, _, length = header.partition(" ")
+    if marker != RESULT_MARKER or not newline or not length.isdigit() or int(length) != len(data):
+        raise ValueError("not a harness report")
+    return json.loads(data)
+
+
+def _prctl(option: int, value: int) -> bool:
+    """Call Linux ``prctl(option, value)``; ``False`` where that is not possible."""
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        import ctypes
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        return libc.prctl(option, value, 0, 0, 0) == 0
+    except (OSError, AttributeError):
+        return False
+
+
+def _protect() -> None:
+    """Make this process non-dumpable: same-user processes lose ptrace and ``/proc`` access."""
+    _prctl(_PR_SET_DUMPABLE, 0)
+
+
+def apply_session_limits() -> None:
+    """Apply (and hide from children) the rlimits the host passed in :data:`RLIMITS_ENV`."""
+    spec = os.environ.pop(RLIMITS_ENV, None)
+    if not spec or resource is None:
+        return
+    for name, (soft, hard) in json.loads(spec).items():
+        which = getattr(resource, name, None)
+        if which is not None:
+            lower_rlimit(which, soft, hard)
+
+
+def _children() -> list[int]:
+    """Pids of this process's children (including reparented orphans and zombies)."""
+    me = os.getpid()
+    try:
+        found = set()
+        for tid in os.listdir(f"/proc/{me}/task"):
+            with open(f"/proc/{me}/task/{tid}/children") as fh:
+                found.update(int(pid) for pid in fh.read().split())
+        return sorted(found)
+    except OSError:  # kernel without CONFIG_PROC_CHILDREN: scan every process
+        pass
+    children = []
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat", "rb") as fh:
+                # fields after the command: state, ppid, ...
+                if int(fh.read().rsplit(b")", 1)[1].split()[1]) == me:
+                    children.append(int(name))
+        except (OSError, IndexError, ValueError):  # exited meanwhile
+            continue
+    return children
+
+
+def reap_orphans(keep=()) -> None:
+    """Kill and reap every child of this subreaper except the runs in ``keep``.
+
+    Killing an orphan hands its own children to us, so repeat until none is left.
+    """
+    if not os.path.isdir("/proc"):
+        return
+    keep = set(keep)
+    for _ in range(1000):
+        orphans = [pid for pid in _children() if pid not in keep]
+        if not orphans:
+            return
+        for pid in orphans:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        for pid in orphans:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+
+
+def _private_stdout():
+    """Move stdout to a private descriptor and send fds 1 and 2 to ``/dev/null``."""
+    sys.stdout.flush()
+    report = os.fdopen(os.dup(1), "wb")  # not inheritable; forked children close it
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    os.close(devnull)
+    return report
+
+
+def _exit_code(exc: SystemExit) -> int:
+    code = exc.code
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def _print_solution_traceback(entry: str) -> None:
+    """Print the current exception without the harness/runpy frames on top."""
+    etype, value, tb = sys.exc_info()
+    while tb is not None and tb.tb_frame.f_code.co_filename != entry:
+        tb = tb.tb_next
+    traceback.print_exception(etype, value, tb or value.__traceback__)
+
+
+def _shutdown() -> None:
+    """What interpreter shutdown does before exiting, which ``os._exit`` skips.
+
+    Waits for non-daemon threads, runs the ``atexit`` handlers and flushes
+    the standard streams, so output printed from either still counts.
+    """
+    try:
+        threading._shutdown()
+    except BaseException:
+        traceback.print_exc()
+    atexit._run_exitfuncs()
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except (OSError, ValueError, AttributeError):  # closed or replaced by the solution
+            pass
+
+
+def _child(entry: str, args: list, out_fd: int, ready_fd: int, baseline_fd: int,
+           cwd: str | None, limits: dict) -> None:
+    """Body of the forked child: behave like ``python ENTRY *ARGS``.
+
+    The child's peak RSS before the solution starts is written to
+    ``baseline_fd``, which is then closed.
+    """
+    code = 1
+    try:
+        atexit._clear()  # handlers of the harness (or zygote preloads) are not the solution's
+        os.setpgid(0, 0)
+        if cwd is not None:
+            os.chdir(cwd)
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.dup2(out_fd, 1)
+        os.dup2(out_fd, 2)
+        os.write(baseline_fd, str(_peak_kb()).encode())
+        # drop inherited descriptors (request pipes, other children's pipes)
+        # so that sibling runs cannot keep each other's exit pipe open
+        os.closerange(3, ready_fd)
+        os.closerange(ready_fd + 1, MAX_FD)
+        sys.argv = [entry, *args]
+        sys.path[0] = os.path.dirname(os.path.abspath(entry))
+        apply_limits(**limits)
+        try:
+            runpy.run_path(entry, run_name="__main__")
+            code = 0
+        except SystemExit as exc:
+            code = _exit_code(exc)
+        except BaseException:
+            _print_solution_traceback(entry)
+            code = 1
+        _shutdown()
+    finally:
+        os._exit(code)
+
+
+class ForkedRun:
+    """A solution run in a forked child of the current interpreter.
+
+    ``ready_fd`` becomes readable (EOF) once the child exits, so callers can
+    wait for many runs at once with ``select``.
+    """
+
+    __slots__ = ("pid", "ready_fd", "baseline_fd", "out", "start", "expected")
+
+    def __init__(self, entry: str, args: list, cwd: str | None = None, *,
+                 cpu_limit: float | None = None, memory_kb: int | None = None,
+                 file_size: int | None = None, expected: str | None = None):
+        # the expected output file, compared with the output in collect()
+        self.expected = expected if expected is None or cwd is None else os.path.join(cwd, expected)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        self.out = tempfile.TemporaryFile()
+        ready_r, ready_w = os.pipe()
+        baseline_r, baseline_w = os.pipe()
+        self.start = time.perf_counter()
+        try:
+            pid = os.fork()
+        except OSError:
+            for fd in (ready_r, ready_w, baseline_r, baseline_w):
+                os.close(fd)
+            self.out.close()
+            raise
+        if pid == 0:
+            os.close(ready_r)
+            _child(entry, args, self.out.fileno(), ready_w, baseline_w, cwd,
+                   {"cpu_limit": cpu_limit, "memory_kb": memory_kb, "file_size": file_size})
+        os.close(ready_w)
+        os.close(baseline_w)
+        try:
+            os.setpgid(pid, pid)  # also done by the child; avoids a kill race
+        except OSError:
+            pass
+        self.pid = pid
+        self.ready_fd = ready_r
+        self.baseline_fd = baseline_r
+
+    def kill(self) -> None:
+        try:
+            os.killpg(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def collect(self, timed_out: bool = False) -> dict:
+        """Reap the child and return its execution record."""
+        if timed_out:
+            self.kill()
+        os.close(self.ready_fd)
+        _, wait_status, usage = os.wait4(self.pid, 0)
+        elapsed = time.perf_counter() - self.start
+        # only the growth beyond the interpreter the child was forked from is the solution's
+        try:
+            baseline_kb = int(os.read(self.baseline_fd, 32) or 0)
+        except ValueError:
+            baseline_kb = 0
+        os.close(self.baseline_fd)
+        with self.out:
+            output = summarize_output(self.out, self.expected)
+
+        if os.WIFSIGNALED(wait_status):
+            status = -os.WTERMSIG(wait_status)
+        else:
+            status = os.WEXITSTATUS(wait_status)
+        return {"status": status, **output, "elapsed": elapsed, "timed_out": timed_out,
+                **usage_record(usage, baseline_kb)}
+
+
+def _run_forked(entry: str, args: list, timeout: float, **limits) -> dict:
+    run = ForkedRun(entry, args, **limits)
+    readable, _, _ = select.select([run.ready_fd], [], [], timeout)
+    record = run.collect(timed_out=not readable)
+    reap_orphans()  # nothing of this case may run on into the next one
+    return record
+
+
+def _run_subprocess(entry: str, args: list, timeout: float, expected: str | None = None) -> dict:
+    start = time.perf_counter()
+    try:
+        proc = subprocess.run(
+            [sys.executable, entry, *args],
+            capture_output=True,
+            timeout=timeout,
+        )
+    except subprocess.TimeoutExpired as exc:
+        return {
+            "status": None,
+            **summarize_output(io.BytesIO((exc.stdout or b"") + (exc.stderr or b"")), expected),
+            "elapsed": time.perf_counter() - start,
+            "timed_out": True,
+            **usage_record(None),
+        }
+    return {
+        "status": proc.returncode,
+        **summarize_output(io.BytesIO(proc.stdout + proc.stderr), expected),
+        "elapsed": time.perf_counter() - start,
+        "timed_out": False,
+        **usage_record(None),
+    }
+
+
+def run_case(entry: str, args: list, timeout: float,
+             cpu_limit: float | None = None, memory_kb: int | None = None,
+             file_size: int | None = None, expected: str | None = None) -> dict:
+    """Run ``entry`` once with ``args`` and return its execution record.
+
+    CPU and memory budgets are only enforced where ``fork`` is available.
+    ``expected`` is the path of the expected output, if any.
+    """
+    if hasattr(os, "fork"):
+        return _run_forked(entry, args, timeout, cpu_limit=cpu_limit, memory_kb=memory_kb,
+                           file_size=file_size, expected=expected)
+    return _run_subprocess(entry, args, timeout, expected)
+
+
+def serve(requests, responses) -> None:
+    """Fork-server loop used by :class:`zygote_runner.ZygoteTaskRunner`.
+
+    Reads one JSON request per line from ``requests``
+    (``{"id", "cwd", "entry", "args", "timeout"}``, optionally with
+    ``cpu_limit``, ``memory_kb``, ``file_size`` and ``expected``, a file name
+    relative to ``cwd``) and forks a child for each one right
+    away, so many runs may be in flight. Every finished run is
+    answered with one JSON line ``{"id", ...record}`` on ``responses``.
+    A ``{"cancel": id}`` line kills that run (it is still answered).
+    Exits when ``requests`` is closed.
+    """
+    req_fd = requests.fileno()
+    buffer = b""
+    running: dict = {}  # ready_fd -> (request id, ForkedRun, deadline)
+    open_input = True
+
+    def reply(req_id, record):
+        record["id"] = req_id
+        responses.write(json.dumps(record) + "\n")
+        responses.flush()
+        reap_orphans(run.pid for _, run, _ in running.values())
+
+    while open_input or running:
+        now = time.monotonic()
+        for fd, (req_id, run, deadline) in list(running.items()):
+            if deadline <= now:
+                del running[fd]
+                reply(req_id, run.collect(timed_out=True))
+        wait_for = list(running)
+        if open_input:
+            wait_for.append(req_fd)
+        wait = min((d for _, _, d in running.values()), default=None)
+        readable, _, _ = select.select(wait_for, [], [], None if wait is None else max(0.0, wait - now))
+
+        for fd in readable:
+            if fd != req_fd:
+                req_id, run, _ = running.pop(fd)
+                reply(req_id, run.collect())
+                continue
+            chunk = os.read(req_fd, 65536)
+            if not chunk:
+                open_input = False
+                continue
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if not line.strip():
+                    continue
+                req = json.loads(line)
+                if "cancel" in req:
+                    for req_id, run, _ in running.values():
+                        if req_id == req["cancel"]:
+                            run.kill()
+                    continue
+                try:
+                    run = ForkedRun(req["entry"], req["args"], req.get("cwd"),
+                                    cpu_limit=req.get("cpu_limit"), memory_kb=req.get("memory_kb"),
+                                    file_size=req.get("file_size"), expected=req.get("expected"))
+                except OSError as exc:
+                    reply(req["id"], {"status": None, "output": f"fork failed: {exc}", "tail": "",
+                                      "size": 0, "truncated": False, "digest": None,
+                                      "elapsed": 0.0, "timed_out": False, **usage_record(None)})
+                    continue
+                running[run.ready_fd] = (req["id"], run, time.monotonic() + req["timeout"])
+
+
+def main(argv: list) -> int:
+    if argv[:1] == ["--serve"]:
+        _protect()  # children must not write fake responses into our stdout
+        _prctl(_PR_SET_CHILD_SUBREAPER, 1)
+        for name in argv[1:]:
+            __import__(name)  # warm the zygote with commonly used modules
+        serve(sys.stdin, sys.stdout)
+        return 0
+    if len(argv) != 2:
+        print("usage: sandbox_harness.py ENTRY CASES_JSON", file=sys.stderr)
+        return 2
+    entry, cases_path = argv
+    _protect()
+    _prctl(_PR_SET_CHILD_SUBREAPER, 1)
+    apply_session_limits()
+    if sys.stdin is not None:
+        sys.stdin.buffer.read()  # the host closes our stdin once we are confined
+    report = _private_stdout()
+    try:
+        with open(cases_path, encoding="utf-8") as fh:
+            cases = json.load(fh)
+        results = [
+            run_case(entry, case["args"], case["timeout"],
+                     case.get("cpu_limit"), case.get("memory_kb"), case.get("file_size"),
+                     case.get("expected"))
+            for case in cases
+        ]
+    except Exception:
+        write_report(report, {"error": traceback.format_exc()})
+        return 1
+    write_report(report, results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,8 +1,39 @@
 import customtkinter as ctk
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from styleManager import StyleManager
+import queue
 import random
+import threading
 from database import Database
+from output_compare import preview
+
+# sandboxes of one submission run concurrently; the host-wide cap still applies
+GRADING_WORKERS = 4
+POLL_INTERVAL_MS = 50
+
+
+def _usage_note(res: dict) -> str:
+    """`` [12 ms, 10.4 MiB]`` style summary of a result's measurements."""
+    parts = []
+    if res.get("elapsed") is not None:
+        parts.append(f"{res['elapsed'] * 1000:.0f} ms")
+    if res.get("memory_kb") is not None:
+        parts.append(f"{res['memory_kb'] / 1024:.1f} MiB")
+    return f" [{', '.join(parts)}]" if parts else ""
+
+
+def _limits_note(limits) -> str:
+    """``2 s wall, 1 s CPU, 64 MiB`` style summary of a test's budget."""
+    parts = []
+    if limits.time is not None:
+        parts.append(f"{limits.time:g} s wall")
+    if limits.cpu is not None:
+        parts.append(f"{limits.cpu:g} s CPU")
+    if limits.memory_kb is not None:
+        parts.append(f"{limits.memory_kb / 1024:g} MiB")
+    return ", ".join(parts)
+
 
 class TaskWindow(ctk.CTkToplevel):
     """Window used to solve a task with animated particle background."""
@@ -13,9 +44,10 @@ class TaskWindow(ctk.CTkToplevel):
             title: str,
             description: str,
             expiration: str | None,
-            tests: list[tuple[str, str]],
+            tests: list[tuple],
             style_mgr: StyleManager,
             *,
+            rules: str | None = None,
             db: Database | None = None,
             user_id: int | None = None,
             task_id: int | None = None,
@@ -26,6 +58,9 @@ class TaskWindow(ctk.CTkToplevel):
         self.db = db
         self.user_id = user_id
         self.task_id = task_id
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._grading = None
+        self._action_buttons: list[ctk.CTkButton] = []
         self.configure(fg_color="#000000")
         self.geometry("720x480")  # Reduced window size
         self.resizable(False, False)
@@ -54,7 +89,7 @@ class TaskWindow(ctk.CTkToplevel):
         self._create_header(container, title)
 
         # Main content area
-        self._create_content(container, title, description, expiration, tests)
+        self._create_content(container, title, description, expiration, tests, rules)
 
         # Start particle animation
         self._animate_particles()
@@ -186,7 +221,7 @@ class TaskWindow(ctk.CTkToplevel):
         close_btn.pack(anchor="center", expand=True)
         close_btn.bind("<Button-1>", self._animate_close_button)
 
-    def _create_content(self, parent, title, description, expiration, tests):
+    def _create_content(self, parent, title, description, expiration, tests, rules=None):
         """Create main content area with task description and code editor"""
         content_frame = ctk.CTkFrame(parent, fg_color="transparent")
         content_frame.pack(fill="both", expand=True, padx=12, pady=(0, 12))
@@ -203,7 +238,7 @@ class TaskWindow(ctk.CTkToplevel):
         left_panel.pack(side="left", fill="y", padx=(0, 10))
         left_panel.pack_propagate(False)
 
-        self._create_description_panel(left_panel, description, expiration, tests)
+        self._create_description_panel(left_panel, description, expiration, tests, rules)
 
         # Right panel - Code editor
         right_panel = ctk.CTkFrame(
@@ -217,7 +252,7 @@ class TaskWindow(ctk.CTkToplevel):
 
         self._create_editor_panel(right_panel)
 
-    def _create_description_panel(self, parent, description, expiration, tests):
+    def _create_description_panel(self, parent, description, expiration, tests, rules=None):
         """Create task description panel"""
         desc_header = ctk.CTkFrame(parent, fg_color="transparent", height=40)  # Smaller header
         desc_header.pack(fill="x", padx=10, pady=(10, 0))
@@ -262,12 +297,16 @@ class TaskWindow(ctk.CTkToplevel):
         desc_text.pack(fill="both", expand=True, padx=10, pady=(0, 10))
 
         desc_text.insert("1.0", f"Description:\n{description}\n\n")
+        if rules:
+            desc_text.insert("end", f"📋 Rules:\n{rules}\n\n")
         desc_text.insert("end", "📝 Test Cases:\n")
         desc_text.insert("end", "─" * 40 + "\n")  # Shorter separator
-        for idx, (case, ans) in enumerate(tests, 1):
+        for idx, (case, ans, *limits) in enumerate(tests, 1):
             desc_text.insert("end", f"Test {idx}:\n")
-            desc_text.insert("end", f"Input:  {case}\n")
-            desc_text.insert("end", f"Output: {ans}\n")
+            desc_text.insert("end", f"Input:  {preview(case)}\n")
+            desc_text.insert("end", f"Output: {preview(ans)}\n")
+            if limits and limits[0] is not None and limits[0].is_set():
+                desc_text.insert("end", f"Limits: {_limits_note(limits[0])}\n")
             desc_text.insert("end", "─" * 20 + "\n")
         desc_text.configure(state="disabled")
 
@@ -381,6 +420,7 @@ if __name__ == "__main__":
             )
             btn.pack(side="left", padx=6, pady=4, expand=True, fill="x")
             btn.bind("<Button-1>", lambda e, b=btn: self._animate_action_button(e, b))
+            self._action_buttons.append(btn)
 
     def _animate_close_button(self, event):
         """Animate close button click"""
@@ -399,60 +439,24 @@ if __name__ == "__main__":
         button.configure(fg_color="#ff6600")
         self.after(120, lambda: button.configure(fg_color="#f09c3a"))
 
-    def _run_code(self):
-        """Run the code using the DockerTaskRunner against stored tests."""
-        from task_checker import check_solution
+    def _result_cache(self):
+        """Grading results shared by every task window (persisted in the DB)."""
+        from result_cache import shared_cache
+        return shared_cache(self.db)
 
+    def _run_code(self):
+        """Run the code against stored tests in the background."""
         code = self.code_box.get("1.0", "end")
-        try:
-            results, passed = check_solution(self.tests, code=code)
-        except Exception as exc:
-            from tkinter import messagebox
-            messagebox.showerror("Execution Error", str(exc))
-            return
-
-        total = len(results)
-        lines = [f"Score: {passed}/{total} tests passed"]
-        for idx, r in enumerate(results, 1):
-            status = "✅" if r["passed"] else "❌"
-            lines.append(
-                f"{status} input: '{r['input']}' expected '{r['expected']}' got '{r['output']}'"
-            )
-
-        self._show_results("Results", "\n".join(lines))
+        self._start_grading("Results", code=code)
 
     def _submit_code(self):
-        """Run tests and store the progress for this task."""
-        from task_checker import check_solution
-        from tkinter import messagebox
-
+        """Run tests in the background and store the progress for this task."""
         code = self.code_box.get("1.0", "end")
-        try:
-            results, passed = check_solution(self.tests, code=code)
-        except Exception as exc:
-            messagebox.showerror("Execution Error", str(exc))
-            return
-
-        total = len(results)
-        lines = [f"Score: {passed}/{total} tests passed"]
-        for idx, r in enumerate(results, 1):
-            status = "✅" if r["passed"] else "❌"
-            lines.append(
-                f"{status} input: '{r['input']}' expected '{r['expected']}' got '{r['output']}'"
-            )
-
-        if self.db and self.user_id is not None and self.task_id is not None:
-            try:
-                self.db.update_task_progress(self.user_id, self.task_id, passed)
-            except Exception as exc:
-                messagebox.showerror("DB Error", str(exc))
-
-        self._show_results("Submission Results", "\n".join(lines))
+        self._start_grading("Submission Results", code=code, submit=True)
 
     def _upload_archive(self):
         """Allow user to select a zip archive with solution and test it."""
-        from tkinter import filedialog, messagebox
-        from task_checker import check_solution
+        from tkinter import filedialog
 
         path = filedialog.askopenfilename(
             title="Select archive",
@@ -460,30 +464,146 @@ if __name__ == "__main__":
         )
         if not path:
             return
+        self._start_grading("Results", archive=path)
+
+    def _start_grading(self, title: str, *, code: str | None = None,
+                       archive: str | None = None, submit: bool = False) -> None:
+        """Grade on a worker thread and stream results into a progress window.
+
+        Results travel back through a queue drained by ``after()`` callbacks,
+        so the window (and its particle animation) stays responsive.
+        """
+        from result_cache import source_digest
+        from task_checker import check_solution, create_runner
+
+        if self._grading is not None:
+            return  # one grading run per window at a time
+
+        runner = create_runner()
+        # (code hash, backend, environment) of the attempt recorded in the submission history
+        submission = None
+        if submit:
+            submission = (source_digest(code=code, archive=archive if code is None else None),
+                          runner.backend_name(), runner.fingerprint())
+        cancel = threading.Event()
+        events: queue.Queue = queue.Queue()
+        dialog = self._open_progress_window(title, len(self.tests))
+        dialog["cancel_btn"].configure(command=self._cancel_grading)
+
+        future = self._executor.submit(
+            check_solution,
+            self.tests,
+            code=code,
+            archive=archive,
+            runner=runner,
+            cache=self._result_cache(),
+            workers=GRADING_WORKERS,
+            on_result=lambda idx, res: events.put((idx, res)),
+            cancel=cancel,
+        )
+        self._grading = (runner, cancel)
+        for btn in self._action_buttons:
+            btn.configure(state="disabled")
+        self.after(POLL_INTERVAL_MS, self._poll_grading, future, events, dialog, submission)
+
+    def _cancel_grading(self) -> None:
+        """Stop the running grading job and kill its in-flight sandboxes."""
+        if self._grading is None:
+            return
+        runner, cancel = self._grading
+        cancel.set()
+        runner.kill_active()
+
+    def _poll_grading(self, future, events: queue.Queue, dialog: dict,
+                      submission: tuple[str, str, str] | None) -> None:
+        """Move finished test results from the worker into the progress window."""
+        from task_checker import GradingCancelled
+        from tkinter import messagebox
+
+        if not self.winfo_exists():
+            return
+        visible = bool(dialog["window"].winfo_exists())
+        while True:
+            try:
+                idx, res = events.get_nowait()
+            except queue.Empty:
+                break
+            dialog["done"] += 1
+            if not visible:
+                continue
+            status = "✅" if res["passed"] else f"❌ {res.get('verdict', 'WA')}"
+            dialog["text"].insert(
+                "end",
+                f"{status} Test {idx + 1}: input: '{res['input']}' "
+                f"expected '{res['expected']}' got '{res['output']}'{_usage_note(res)}\n",
+            )
+            mismatch = res.get("mismatch")
+            if mismatch and res.get("verdict") == "WA":
+                dialog["text"].insert(
+                    "end",
+                    f"    first difference at line {mismatch['line']}, column {mismatch['column']}\n",
+                )
+            total = dialog["total"]
+            dialog["bar"].set(dialog["done"] / total if total else 1)
+            dialog["label"].configure(text=f"Running tests… {dialog['done']}/{total}")
+
+        if not future.done():
+            self.after(POLL_INTERVAL_MS, self._poll_grading, future, events, dialog, submission)
+            return
+
+        self._grading = None
+        for btn in self._action_buttons:
+            btn.configure(state="normal")
+        if visible:
+            dialog["cancel_btn"].configure(text="Close", command=dialog["window"].destroy)
+            dialog["window"].protocol("WM_DELETE_WINDOW", dialog["window"].destroy)
 
         try:
-            results, passed = check_solution(self.tests, archive=path)
+            results, passed = future.result()
+        except GradingCancelled:
+            if visible:
+                dialog["label"].configure(text="Cancelled")
+            return
         except Exception as exc:
-            messagebox.showerror("Execution Error", str(exc))
+            if visible:
+                dialog["label"].configure(text="Execution error")
+            messagebox.showerror("Execution Error", str(exc), parent=self)
             return
 
-        total = len(results)
-        lines = [f"Score: {passed}/{total} tests passed"]
-        for idx, r in enumerate(results, 1):
-            status = "✅" if r["passed"] else "❌"
-            lines.append(
-                f"{status} input: '{r['input']}' expected '{r['expected']}' got '{r['output']}'"
-            )
+        score = f"Score: {passed}/{len(results)} tests passed"
+        if visible:
+            dialog["bar"].set(1)
+            dialog["label"].configure(text=score)
+            dialog["text"].insert("1.0", score + "\n")
 
-        self._show_results("Results", "\n".join(lines))
+        if submission and self.db and self.user_id is not None and self.task_id is not None:
+            try:
+                code_hash, backend, environment = submission
+                self.db.record_submission(self.user_id, self.task_id, code_hash, backend,
+                                          results, environment)
+                self.db.update_task_progress(self.user_id, self.task_id, passed)
+            except Exception as exc:
+                messagebox.showerror("DB Error", str(exc), parent=self)
 
-    def _show_results(self, title: str, message: str) -> None:
-        """Display test results in a scrollable, copyable window."""
+    def _open_progress_window(self, title: str, total: int) -> dict:
+        """Create the results window with a progress bar and a Cancel button."""
         win = ctk.CTkToplevel(self)
         win.title(title)
         win.geometry("500x400")
         win.minsize(400, 300)
 
+        label = ctk.CTkLabel(
+            win,
+            text=f"Running tests… 0/{total}",
+            font=("SF Pro Display", 13, "bold"),
+            text_color="#f09c3a",
+        )
+        label.pack(fill="x", padx=10, pady=(10, 4))
+
+        bar = ctk.CTkProgressBar(win, progress_color="#f09c3a")
+        bar.set(0)
+        bar.pack(fill="x", padx=10, pady=(0, 6))
+
         text = ctk.CTkTextbox(
             win,
             wrap="none",
@@ -492,7 +612,31 @@ if __name__ == "__main__":
             scrollbar_button_color="#f09c3a",
             scrollbar_button_hover_color="#ff8800",
         )
-        text.pack(fill="both", expand=True, padx=10, pady=10)
-        text.insert("1.0", message)
-        text.configure(state="normal")
+        text.pack(fill="both", expand=True, padx=10, pady=(0, 6))
+
+        cancel_btn = ctk.CTkButton(
+            win,
+            text="Cancel",
+            font=("SF Pro Display", 12, "bold"),
+            height=28,
+            fg_color="#e74c3c",
+            hover_color="#c0392b",
+            text_color="#ffffff",
+            corner_radius=8,
+        )
+        cancel_btn.pack(pady=(0, 10))
+
+        def close():
+            self._cancel_grading()
+            win.destroy()
+
+        win.protocol("WM_DELETE_WINDOW", close)
+
+        return {"window": win, "label": label, "bar": bar, "text": text,
+                "cancel_btn": cancel_btn, "done": 0, "total": total}
 
+    def destroy(self):
+        """Cancel a running grading job before closing the window."""
+        self._cancel_grading()
+        self._executor.shutdown(wait=False)
+        super().destroy()
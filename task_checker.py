@@ -29,9 +29,48 @@ def _parse_args(inp: str) -> list[str]:
         return [str(v) for v in value]
     return [str(value)]
 
+from async_runner import AsyncTaskRunner
 from docker_runner import DockerTaskRunner
+from limits import Limits
+from output_compare import Comparison, compare_output, locate, preview, text_digest
+from result_cache import ResultCache, source_digest
+from zygote_runner import ZygoteTaskRunner
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 from contextlib import contextmanager
+from typing import Callable
+import os
+import signal
 import tempfile
+import threading
+
+TaskRunner = DockerTaskRunner | ZygoteTaskRunner
+
+RUNNER_BACKENDS = ("auto", "docker", "zygote")
+
+# accepted, wrong answer, runtime error, time / memory limit exceeded
+VERDICTS = ("OK", "WA", "RE", "TLE", "MLE")
+_SIGXCPU = getattr(signal, "SIGXCPU", None)
+
+# characters of a test's output kept in its result entry
+REPORTED_OUTPUT = 64 * 1024
+
+
+def create_runner(backend: str | None = None) -> TaskRunner:
+    """Create a runner for ``backend`` (default: ``$PYGRADER_RUNNER`` or ``auto``).
+
+    ``docker`` and ``auto`` return :class:`DockerTaskRunner`, which uses
+    Docker when it is reachable and confines host processes with
+    :class:`local_sandbox.LocalSandbox` otherwise. ``zygote`` is the faster
+    fork-server backend; it only applies the per-test budgets and has to be
+    asked for explicitly.
+    """
+    backend = backend or os.environ.get("PYGRADER_RUNNER", "auto")
+    if backend not in RUNNER_BACKENDS:
+        raise ValueError(f"Unknown runner backend: {backend!r}")
+    if backend == "zygote":
+        return ZygoteTaskRunner()
+    return DockerTaskRunner()
 
 
 def extract_code_from_archive(archive_path: str | Path) -> str:
@@ -94,62 +133,358 @@ def extract_project_from_archive(archive_path: str | Path) -> tuple[Path, str]:
         tmpdir.cleanup()
 
 
+def _verdict(res: Dict[str, Any], output_ok: bool, limits: Limits) -> str:
+    """Classify a run as one of :data:`VERDICTS`; resource verdicts take precedence."""
+    status = res.get('status')
+    cpu_time = res.get('cpu_time') or 0.0
+    if (res.get('timed_out')
+            or (_SIGXCPU is not None and status == -_SIGXCPU)
+            or (limits.cpu and cpu_time > limits.cpu)):
+        return 'TLE'
+    if limits.memory_kb and (
+        (res.get('memory_kb') or 0) > limits.memory_kb
+        or (status != 0 and 'MemoryError' in (res.get('output') or '') + (res.get('tail') or ''))
+    ):
+        return 'MLE'
+    if status != 0:
+        return 'RE'
+    return 'OK' if output_ok else 'WA'
+
+
+def _build_result(inp, expected, res: Dict[str, Any], limits: Limits | None = None) -> Dict[str, Any]:
+    """Turn a raw runner record into the result entry reported for one test.
+
+    ``inp`` and ``expected`` may be strings or lazy blob handles. The run
+    passes when the digest of its stripped output matches ``expected``. A
+    difference is located from the runner's ``difference`` when it compared
+    the whole output, and otherwise in the reported preview (see
+    :mod:`output_compare`).
+    """
+    raw = res.get('output') or ''
+    truncated = bool(res.get('truncated'))
+    expected_text = expected if hasattr(expected, 'chunks') else str(expected)
+    digest = res.get('digest')
+    difference = res.get('difference')
+    if digest is not None and digest == text_digest(expected_text):
+        output_ok, comparison = True, Comparison(True)
+    elif difference is not None:
+        output_ok = False
+        comparison = locate(expected_text, difference['offset'], difference['got'])
+    else:
+        comparison = compare_output(raw, expected_text)
+        # without a digest (the run never reported) only a complete output can match
+        output_ok = digest is None and comparison.passed and not truncated
+    # a difference found in the preview where it ends may lie anywhere in the unreported rest
+    located = not comparison.passed and (
+        difference is not None or not (truncated and not comparison.got))
+    verdict = _verdict(res, output_ok, limits or Limits())
+    return {
+        'input': inp if isinstance(inp, str) else preview(inp),
+        'expected': expected if isinstance(expected, str) else preview(expected),
+        'output': preview(raw.strip(), REPORTED_OUTPUT),
+        'passed': verdict == 'OK',
+        'verdict': verdict,
+        'status': res.get('status'),
+        'timed_out': bool(res.get('timed_out')),
+        'truncated': truncated,
+        'elapsed': res.get('elapsed'),
+        'cpu_time': res.get('cpu_time'),
+        'memory_kb': res.get('memory_kb'),
+        'mismatch': None if not located else {
+            'offset': comparison.offset,
+            'line': comparison.line,
+            'column': comparison.column,
+            'expected': comparison.expected,
+            'got': comparison.got,
+        },
+    }
+
+
+def _cacheable(res: Dict[str, Any], result: Dict[str, Any]) -> bool:
+    """Whether a test result may be cached: only a clean exit of the solution is.
+
+    A timeout depends on host load, and a record without an exit status or a
+    harness report (a failed fork, a sandbox error, a killed run) says nothing
+    about the solution itself.
+    """
+    status = res.get('status')
+    return (result['verdict'] != 'TLE' and isinstance(status, int) and status >= 0
+            and res.get('digest') is not None)
+
+
+def _split(items: list, parts: int) -> list[list]:
+    """Split ``items`` into at most ``parts`` contiguous, similarly sized chunks."""
+    size, extra = divmod(len(items), parts)
+    chunks, start = [], 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        if end > start:
+            chunks.append(items[start:end])
+        start = end
+    return chunks
+
+
+def _units(count: int, isolated: bool, workers: int) -> list[list[int]]:
+    """Group test indices into sandbox runs: one per test, or ``workers`` batches."""
+    indices = list(range(count))
+    return [[i] for i in indices] if isolated else _split(indices, max(1, min(workers, count)))
+
+
+def _budgets(tests: list, limits: Limits | None) -> list[Limits]:
+    """Each test's own :class:`Limits` with unset fields taken from ``limits``."""
+    return [
+        (test[2] if len(test) > 2 and test[2] is not None else Limits()).over(limits)
+        for test in tests
+    ]
+
+
+def _cache_keys(cache: ResultCache, tests: list, budgets: list[Limits], fingerprint: str,
+                timeout: int, code: str | None, archive: str | Path | None) -> list[str]:
+    digest = source_digest(code=code, archive=archive if code is None else None)
+    return [
+        cache.key(digest, test[0], test[1], fingerprint,
+                  [budget.time or timeout, budget.cpu, budget.memory_kb] if budget.is_set() else timeout)
+        for test, budget in zip(tests, budgets)
+    ]
+
+
+class GradingCancelled(Exception):
+    """Raised by :func:`check_solution` when its ``cancel`` event was set."""
+
+
+def _execute_tests(
+    runner: TaskRunner,
+    argvs: list[list[str]],
+    case_limits: list[Limits],
+    timeout: int,
+    isolated: bool,
+    workers: int,
+    on_done: Callable[[int, Dict[str, Any]], None],
+    cancel: threading.Event | None,
+    expected: list | None = None,
+    **source: Any,
+) -> None:
+    """Run every argument list either batched or one by one, ``workers`` at a time.
+
+    ``on_done(index, record)`` is called (from a worker thread when
+    ``workers > 1``) as soon as the run for ``argvs[index]`` has finished. The
+    host-wide sandbox cap of :mod:`docker_runner` still applies on top of
+    ``workers``. No new run is started once ``cancel`` is set. ``expected``
+    holds the expected output of every run, for locating differences.
+    """
+    expected = expected or [None] * len(argvs)
+    workers = max(1, min(workers, len(argvs)))
+    units = _units(len(argvs), isolated, workers)
+
+    def run_unit(unit):
+        if cancel is not None and cancel.is_set():
+            raise GradingCancelled()
+        if isolated:
+            records = [runner.run_code(args=argvs[unit[0]], timeout=timeout,
+                                       limits=case_limits[unit[0]], expected=expected[unit[0]],
+                                       **source)]
+        else:
+            records = runner.run_batch(cases=[argvs[i] for i in unit], timeout=timeout,
+                                       limits=[case_limits[i] for i in unit],
+                                       expected=[expected[i] for i in unit], **source)
+        for i, record in zip(unit, records):
+            on_done(i, record)
+
+    if workers == 1:
+        for unit in units:
+            run_unit(unit)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in [pool.submit(run_unit, unit) for unit in units]:
+            future.result()
+
+
+class _Grading:
+    """Cache lookups and result bookkeeping shared by both check functions.
+
+    Cached results are reported to ``on_result`` right away; ``pending``
+    lists the indices of the tests still to run, with their ``argvs``,
+    ``case_limits`` and ``expected`` outputs in the same order.
+    """
+
+    def __init__(self, tests: list, limits: Limits | None, timeout: int,
+                 code: str | None, archive: str | Path | None, fingerprint: str,
+                 cache: ResultCache | None,
+                 on_result: Callable[[int, Dict[str, Any]], None] | None):
+        self.tests = tests
+        self.budgets = _budgets(tests, limits)
+        self.cache = cache
+        self.on_result = on_result
+        self.results: List[Dict[str, Any] | None] = [None] * len(tests)
+        self.keys: list[str] = []
+        if cache is not None:
+            self.keys = _cache_keys(cache, tests, self.budgets, fingerprint, timeout, code, archive)
+            self.results = [cache.get(key) for key in self.keys]
+
+        self.pending = [i for i, r in enumerate(self.results) if r is None]
+        if on_result is not None:
+            for i, r in enumerate(self.results):
+                if r is not None:
+                    on_result(i, r)
+        self.argvs = [_parse_args(str(tests[i][0])) for i in self.pending]
+        self.case_limits = [self.budgets[i] for i in self.pending]
+        self.expected = [tests[i][1] for i in self.pending]
+
+    def done(self, j: int, res: Dict[str, Any]) -> None:
+        """Record the runner's record ``res`` for the ``j``-th pending test."""
+        i = self.pending[j]
+        self.results[i] = _build_result(self.tests[i][0], self.tests[i][1], res, self.budgets[i])
+        if self.cache is not None and _cacheable(res, self.results[i]):
+            self.cache.put(self.keys[i], self.results[i])
+        if self.on_result is not None:
+            self.on_result(i, self.results[i])
+
+    def outcome(self) -> tuple[List[Dict[str, Any]], int]:
+        return self.results, sum(1 for r in self.results if r['passed'])
+
+
 def check_solution(
-    tests: Iterable[Tuple[str, str]],
+    tests: Iterable[Tuple[str, str] | Tuple[str, str, Limits]],
     *,
     code: str | None = None,
     archive: str | Path | None = None,
-    runner: DockerTaskRunner | None = None,
+    runner: TaskRunner | None = None,
     timeout: int = 5,
+    limits: Limits | None = None,
+    isolated: bool = False,
+    workers: int = 1,
+    cache: ResultCache | None = None,
+    on_result: Callable[[int, Dict[str, Any]], None] | None = None,
+    cancel: threading.Event | None = None,
 ) -> tuple[List[Dict[str, Any]], int]:
-    """Run solution code against test cases using ``DockerTaskRunner``.
+    """Run solution code against test cases using a task runner.
 
     Either ``code`` or ``archive`` must be provided. ``tests`` is an iterable of
     ``(args, expected_output)`` pairs. Each ``args`` value is a string that will
     be parsed similar to a shell command and passed to ``main.py`` as
     ``sys.argv[1:]``. The return value contains one entry per test describing
-    the execution outcome.
+    the execution outcome. Without ``runner`` one is chosen by
+    :func:`create_runner`.
+
+    By default the solution is staged once and all tests are executed in a
+    single sandbox session (see :meth:`DockerTaskRunner.run_batch`). Pass
+    ``isolated=True`` to start a separate sandbox for every test instead.
+
+    ``workers`` sets how many sandboxes of this submission may run at the same
+    time; batched runs are split into that many chunks. Result order always
+    matches ``tests``.
+
+    A test may carry a third element, its :class:`limits.Limits`; unset
+    fields fall back to ``limits`` and the wall time to ``timeout``. CPU and
+    memory budgets are enforced by the runner, and every result gets a
+    ``verdict`` from :data:`VERDICTS` (``passed`` means ``"OK"``).
+
+    With a ``cache`` only tests without a stored result for this exact
+    solution, test case, runner and budget are executed.
+
+    ``on_result(index, result)`` is invoked for every test as soon as its
+    result is known, possibly from a worker thread. Setting ``cancel`` stops
+    launching further runs and makes the call raise :class:`GradingCancelled`;
+    to also stop runs already in flight call ``runner.kill_active()``.
     """
 
     if code is None and archive is None:
         raise ValueError("Either code or archive must be supplied")
 
     if runner is None:
-        runner = DockerTaskRunner()
+        runner = create_runner()
+
+    grading = _Grading(list(tests), limits, timeout, code, archive, runner.fingerprint(),
+                       cache, on_result)
+    pending = grading.pending
+
+    def on_done(j: int, res: Dict[str, Any]) -> None:
+        if cancel is not None and cancel.is_set():
+            return  # the run may have been killed; its record is meaningless
+        grading.done(j, res)
+
+    try:
+        if pending and code is None:
+            with extract_project_from_archive(archive) as (dir_path, entry):
+                _execute_tests(runner, grading.argvs, grading.case_limits, timeout, isolated, workers,
+                               on_done, cancel, grading.expected,
+                               code=None, dir_path=dir_path, entry=entry)
+        elif pending:
+            _execute_tests(runner, grading.argvs, grading.case_limits, timeout, isolated, workers,
+                           on_done, cancel, grading.expected, code=code)
+    except Exception as exc:
+        # killed runs surface as arbitrary runner errors
+        if cancel is not None and cancel.is_set():
+            raise GradingCancelled() from exc
+        raise
+
+    if cancel is not None and cancel.is_set():
+        raise GradingCancelled()
+    return grading.outcome()
 
-    results: List[Dict[str, Any]] = []
-    passed_count = 0
 
-    if code is None:
+async def async_check_solution(
+    tests: Iterable[Tuple[str, str] | Tuple[str, str, Limits]],
+    *,
+    code: str | None = None,
+    archive: str | Path | None = None,
+    runner: AsyncTaskRunner | None = None,
+    timeout: int = 5,
+    limits: Limits | None = None,
+    isolated: bool = False,
+    workers: int = 1,
+    cache: ResultCache | None = None,
+    on_result: Callable[[int, Dict[str, Any]], None] | None = None,
+) -> tuple[List[Dict[str, Any]], int]:
+    """Coroutine version of :func:`check_solution` for use inside an event loop.
+
+    Arguments and results are those of :func:`check_solution`, with an
+    :class:`async_runner.AsyncTaskRunner` as ``runner``. All sandbox runs
+    (one per test with ``isolated=True``, otherwise ``workers`` batches) are
+    awaited together; the runner's semaphore and the host-wide cap bound
+    how many are active.
+    ``on_result`` is called on the event loop. Cancelling the awaiting task
+    stops grading and kills the sandboxes in flight.
+    """
+    if code is None and archive is None:
+        raise ValueError("Either code or archive must be supplied")
+
+    if runner is None:
+        runner = AsyncTaskRunner()
+
+    await runner.ready()
+    grading = _Grading(list(tests), limits, timeout, code, archive, runner.fingerprint(),
+                       cache, on_result)
+    pending = grading.pending
+
+    async def run_unit(unit: list[int], **source: Any) -> None:
+        if isolated:
+            records = [await runner.run_code(args=grading.argvs[unit[0]], timeout=timeout,
+                                             limits=grading.case_limits[unit[0]],
+                                             expected=grading.expected[unit[0]], **source)]
+        else:
+            records = await runner.run_batch(cases=[grading.argvs[j] for j in unit], timeout=timeout,
+                                             limits=[grading.case_limits[j] for j in unit],
+                                             expected=[grading.expected[j] for j in unit], **source)
+        for j, res in zip(unit, records):
+            grading.done(j, res)
+
+    async def run_all(**source: Any) -> None:
+        runs = [asyncio.ensure_future(run_unit(unit, **source))
+                for unit in _units(len(pending), isolated, workers)]
+        try:
+            await asyncio.gather(*runs)
+        except BaseException:
+            # stop (and kill the sandboxes of) the runs still in flight
+            for run in runs:
+                run.cancel()
+            await asyncio.gather(*runs, return_exceptions=True)
+            raise
+
+    if pending and code is None:
         with extract_project_from_archive(archive) as (dir_path, entry):
-            for inp, expected in tests:
-                argv = _parse_args(inp)
-                res = runner.run_code(None, dir_path=dir_path, entry=entry, args=argv, timeout=timeout)
-                output = res.get('output', '').strip()
-                passed = output == str(expected)
-                if passed:
-                    passed_count += 1
-                results.append({
-                    'input': inp,
-                    'expected': expected,
-                    'output': output,
-                    'passed': passed,
-                    'status': res.get('status'),
-                })
-    else:
-        for inp, expected in tests:
-            argv = _parse_args(inp)
-            res = runner.run_code(code, args=argv, timeout=timeout)
-            output = res.get('output', '').strip()
-            passed = output == str(expected)
-            if passed:
-                passed_count += 1
-            results.append({
-                'input': inp,
-                'expected': expected,
-                'output': output,
-                'passed': passed,
-                'status': res.get('status'),
-            })
-
-    return results, passed_count
+            await run_all(code=None, dir_path=dir_path, entry=entry)
+    elif pending:
+        await run_all(code=code)
+
+    return grading.outcome()
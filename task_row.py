@@ -0,0 +1,74 @@
+_UNSET = object()
+
+
+class TaskRow:
+    """A Task row whose encrypted columns are decrypted on first access.
+
+    Readers such as :meth:`Database.get_tasks` return these instead of fully
+    decrypted tuples, so a list view only pays for the columns it shows. Each
+    column is decrypted at most once per row (and through the database's
+    decryption cache). For backwards compatibility a row still unpacks and
+    indexes like the old tuple ``(task_id, title, description, expiration,
+    rules[, passed[, total_tests]])`` – doing so decrypts every column.
+    """
+
+    __slots__ = ("task_id", "passed", "total_tests", "_db", "_raw", "_plain", "_extra")
+
+    _COLUMNS = ("title", "description", "expiration_date", "validation_rules")
+
+    def __init__(self, db, task_id: int, title: str, description: str,
+                 expiration: str | None, rules: str, *extra: int):
+        self._db = db
+        self.task_id = task_id
+        self._raw = (title, description, expiration, rules)
+        self._plain = [_UNSET] * 4
+        self._extra = extra
+        self.passed = extra[0] if len(extra) > 0 else None
+        self.total_tests = extra[1] if len(extra) > 1 else None
+
+    def _column(self, idx: int) -> str | None:
+        value = self._plain[idx]
+        if value is _UNSET:
+            raw = self._raw[idx]
+            value = None if raw is None else self._db._dec_cached(
+                "Task", self.task_id, self._COLUMNS[idx], raw
+            )
+            self._plain[idx] = value
+        return value
+
+    @property
+    def title(self) -> str:
+        return self._column(0)
+
+    @property
+    def description(self) -> str:
+        return self._column(1)
+
+    @property
+    def expiration(self) -> str | None:
+        return self._column(2)
+
+    @property
+    def rules(self) -> str:
+        return self._column(3)
+
+    def __len__(self) -> int:
+        return 5 + len(self._extra)
+
+    def __iter__(self):
+        yield self.task_id
+        for idx in range(4):
+            yield self._column(idx)
+        yield from self._extra
+
+    def __getitem__(self, item):
+        if isinstance(item, int) and 0 <= item < len(self):
+            if item == 0:
+                return self.task_id
+            if item <= 4:
+                return self._column(item - 1)
+            return self._extra[item - 5]
+        return tuple(self)[item]
+
+    def __repr__(self) -> str:
+        return f"TaskRow(task_id={self.task_id!r})"
@@ -76,10 +76,7 @@ class UserScene(ctk.CTkFrame):
 
     def _get_username(self):
         """Get username for current user"""
-        for uid, name, _, _ in self.db.get_users():
-            if uid == self.user_id:
-                return name
-        return "Unknown User"
+        return self.db.get_username(self.user_id) or "Unknown User"
 
     def _build(self):
         """Build UI with LoginScene's aesthetic"""
@@ -187,22 +184,21 @@ class UserScene(ctk.CTkFrame):
         self.master.destroy()
         self.master.master.deiconify()
 
-    def _open_task_window(self, task):
+    def _open_task_window(self, task_id: int):
         """Open window to solve the selected task."""
-        # Tasks retrieved from `_show_my_tasks` contain a `passed` field while
-        # those from `_show_all_tasks` do not.  Handle both formats.
-        if len(task) == 6:
-            task_id, title, description, expiration, rules, _ = task
-        else:
-            task_id, title, description, expiration, rules = task
-        tests = list(self.db.get_test_cases(task_id))
+        task = self.db.get_task(task_id)
+        if task is None:
+            messagebox.showwarning("Missing", "This task no longer exists 💔")
+            return
+        tests = list(self.db.get_test_cases(task_id, lazy=True, with_limits=True))
         TaskWindow(
             self.master,
-            title,
-            description,
-            expiration,
+            task.title,
+            task.description,
+            task.expiration,
             tests,
             self.sm,
+            rules=task.rules,
             db=self.db,
             user_id=self.user_id,
             task_id=task_id,
@@ -220,7 +216,7 @@ class UserScene(ctk.CTkFrame):
         ).pack(pady=(10, 20))
 
         # Get tasks from database
-        tasks = list(self.db.get_tasks_for_user(self.user_id))
+        tasks = list(self.db.get_tasks_for_user_with_counts(self.user_id))
 
         if not tasks:
             ctk.CTkLabel(
@@ -240,8 +236,10 @@ class UserScene(ctk.CTkFrame):
         container.pack(fill="both", expand=True, padx=20, pady=10)
 
         for task in tasks:
-            task_id, title, description, expiration, rules, passed = task
-            
+            # columns are decrypted on access, only for what the card shows;
+            # description and rules wait until the task is opened
+            title, expiration, passed, total_tests = task.title, task.expiration, task.passed, task.total_tests
+
             # Task card
             card = ctk.CTkFrame(
                 container,
@@ -273,43 +271,7 @@ class UserScene(ctk.CTkFrame):
             )
             exp_label.pack(side="right", padx=10)
 
-            # Task description
-            desc_frame = ctk.CTkFrame(card, fg_color="transparent")
-            desc_frame.pack(fill="x", padx=15, pady=(0, 10))
-
-            ctk.CTkLabel(
-                desc_frame,
-                text=description,
-                font=("Helvetica", 13),
-                text_color="#ffffff",
-                wraplength=700,
-                justify="left"
-            ).pack(anchor="w")
-
-            # Validation rules
-            if rules:
-                rules_frame = ctk.CTkFrame(card, fg_color="transparent")
-                rules_frame.pack(fill="x", padx=15, pady=(0, 10))
-
-                ctk.CTkLabel(
-                    rules_frame,
-                    text="📋 Rules:",
-                    font=("Helvetica", 12, "bold"),
-                    text_color="#f09c3a"
-                ).pack(anchor="w")
-
-
-                ctk.CTkLabel(
-                    rules_frame,
-                    text=rules,
-                    font=("Helvetica", 11),
-                    text_color="#cccccc",
-                    wraplength=700,
-                    justify="left"
-                ).pack(anchor="w", padx=(20, 0))
-
             # Progress information
-            total_tests = self.db.count_tests(task_id)
             status_frame = ctk.CTkFrame(card, fg_color="transparent")
             status_frame.pack(fill="x", padx=15, pady=(0, 5))
 
@@ -335,7 +297,7 @@ class UserScene(ctk.CTkFrame):
             ctk.CTkButton(
                 card,
                 text="Solve",
-                command=lambda t=task: self._open_task_window(t),
+                command=lambda tid=task.task_id: self._open_task_window(tid),
                 font=("Helvetica", 12, "bold"),
                 fg_color="#f09c3a",
                 hover_color="#ff8800",
@@ -376,7 +338,7 @@ class UserScene(ctk.CTkFrame):
         container.pack(fill="both", expand=True, padx=20, pady=10)
 
         for task in tasks:
-            task_id, title, description, expiration, rules = task
+            task_id, title, expiration = task.task_id, task.title, task.expiration
 
             # Task card
             card = ctk.CTkFrame(
@@ -409,44 +371,10 @@ class UserScene(ctk.CTkFrame):
             )
             exp_label.pack(side="right", padx=10)
 
-            # Task description
-            desc_frame = ctk.CTkFrame(card, fg_color="transparent")
-            desc_frame.pack(fill="x", padx=15, pady=(0, 10))
-
-            ctk.CTkLabel(
-                desc_frame,
-                text=description,
-                font=("Helvetica", 13),
-                text_color="#ffffff",
-                wraplength=700,
-                justify="left"
-            ).pack(anchor="w")
-
-            # Validation rules
-            if rules:
-                rules_frame = ctk.CTkFrame(card, fg_color="transparent")
-                rules_frame.pack(fill="x", padx=15, pady=(0, 15))
-
-                ctk.CTkLabel(
-                    rules_frame,
-                    text="📋 Validation Rules:",
-                    font=("Helvetica", 12, "bold"),
-                    text_color="#f09c3a"
-                ).pack(anchor="w")
-
-                ctk.CTkLabel(
-                    rules_frame,
-                    text=rules,
-                    font=("Helvetica", 11),
-                    text_color="#cccccc",
-                    wraplength=700,
-                    justify="left"
-                ).pack(anchor="w", padx=(20, 0))
-
             ctk.CTkButton(
                 card,
                 text="Solve",
-                command=lambda t=task: self._open_task_window(t),
+                command=lambda tid=task.task_id: self._open_task_window(tid),
                 font=("Helvetica", 12, "bold"),
                 fg_color="#f09c3a",
                 hover_color="#ff8800",
@@ -467,7 +395,7 @@ class UserScene(ctk.CTkFrame):
         ).pack(pady=(10, 20))
 
         # Get users from database
-        users = list(self.db.get_users())
+        users = list(self.db.list_users())
 
         if not users:
             ctk.CTkLabel(
@@ -496,7 +424,7 @@ class UserScene(ctk.CTkFrame):
 
         # Table rows
         for row, user in enumerate(users, 1):
-            user_id, username, hashed_password, is_admin = user
+            user_id, username, is_admin, has_password = user
 
             # User ID
             ctk.CTkLabel(
@@ -535,8 +463,8 @@ class UserScene(ctk.CTkFrame):
             ).grid(row=row, column=2, padx=5, pady=5, sticky="w")
 
             # Status (active since they have password)
-            status = "Active" if hashed_password else "Inactive"
-            status_color = "#2ecc71" if hashed_password else "#e74c3c"
+            status = "Active" if has_password else "Inactive"
+            status_color = "#2ecc71" if has_password else "#e74c3c"
 
             ctk.CTkLabel(
                 table_frame,
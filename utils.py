@@ -1,4 +1,7 @@
 import hashlib
 
+# Key used to encrypt database.db (shared by the GUI and the command-line tools).
+ENCRYPTION_KEY = b"6FZ8yxGRNCJ9YB5QeT1J3z2tKf5uXyJdvC9Bn8lT6iY="
+
 def hash_sha256(text: str) -> str:
     return hashlib.sha256(text.encode()).hexdigest()
@@ -0,0 +1,232 @@
+import atexit
+import itertools
+import json
+import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, Any, List
+
+from docker_runner import HARNESS_SOURCE, _sandbox_slots, staged_expected
+from limits import Limits
+from local_sandbox import parse_size
+from logger import log
+
+# Modules imported by the zygote before it starts forking, so that solutions
+# importing them find them already loaded.
+DEFAULT_PRELOAD = ("collections", "functools", "heapq", "itertools", "math", "re", "string")
+
+
+class _Zygote:
+    """Client side of one ``sandbox_harness.py --serve`` fork server."""
+
+    def __init__(self, preload: tuple[str, ...]):
+        self.preload = preload
+        self._proc: subprocess.Popen | None = None
+        self._pending: dict[int, Future] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def _start(self) -> subprocess.Popen:
+        proc = subprocess.Popen(
+            [sys.executable, str(HARNESS_SOURCE), "--serve", *self.preload],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+        )
+        threading.Thread(target=self._read_responses, args=(proc,), daemon=True).start()
+        log.info("Started zygote pid %s", proc.pid)
+        return proc
+
+    def _read_responses(self, proc: subprocess.Popen) -> None:
+        for line in proc.stdout:
+            record = json.loads(line)
+            with self._lock:
+                future = self._pending.pop(record.pop("id"), None)
+            if future is not None:
+                future.set_result(record)
+        # zygote exited: fail whatever it still owed us
+        with self._lock:
+            if self._proc is proc:
+                self._proc = None
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(RuntimeError("zygote process exited unexpectedly"))
+
+    def submit(self, cwd: str, entry: str, args: list[str], timeout: float,
+               cpu_limit: float | None = None, memory_kb: int | None = None,
+               file_size: int | None = None, expected: str | None = None) -> tuple[int, Future]:
+        """Ask the zygote to fork a child running ``entry``; return its id and future.
+
+        ``expected`` names a file in ``cwd`` with the expected output.
+        """
+        future: Future = Future()
+        with self._lock:
+            if self._proc is None or self._proc.poll() is not None:
+                self._proc = self._start()
+            req_id = next(self._ids)
+            self._pending[req_id] = future
+            request = {"id": req_id, "cwd": cwd, "entry": entry, "args": args, "timeout": timeout,
+                       "cpu_limit": cpu_limit, "memory_kb": memory_kb, "file_size": file_size,
+                       "expected": expected}
+            self._proc.stdin.write(json.dumps(request) + "\n")
+            self._proc.stdin.flush()
+        return req_id, future
+
+    def cancel(self, req_id: int) -> None:
+        """Kill the child serving ``req_id`` if it is still running."""
+        with self._lock:
+            if self._proc is None or req_id not in self._pending:
+                return
+            self._proc.stdin.write(json.dumps({"cancel": req_id}) + "\n")
+            self._proc.stdin.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            proc, self._proc = self._proc, None
+        if proc is not None:
+            proc.stdin.close()
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+_ZYGOTES: dict[tuple[str, ...], _Zygote] = {}
+_ZYGOTES_LOCK = threading.Lock()
+
+
+def _shared_zygote(preload: tuple[str, ...]) -> _Zygote:
+    with _ZYGOTES_LOCK:
+        zygote = _ZYGOTES.get(preload)
+        if zygote is None:
+            zygote = _ZYGOTES[preload] = _Zygote(preload)
+    return zygote
+
+
+@atexit.register
+def close_all_zygotes() -> None:
+    """Shut down every fork server (called automatically at exit)."""
+    with _ZYGOTES_LOCK:
+        zygotes = list(_ZYGOTES.values())
+        _ZYGOTES.clear()
+    for zygote in zygotes:
+        zygote.close()
+
+
+class ZygoteTaskRunner:
+    """Run Python code in children forked from a pre-initialised interpreter.
+
+    A long-lived ``sandbox_harness.py --serve`` process (the zygote) has
+    already paid interpreter start-up and ``site`` import; every run is a
+    ``fork`` of it with its own ``cwd``, ``argv``, captured output and
+    timeout. This backend runs on the host without Docker isolation and
+    therefore needs a POSIX system. Only the per-test budgets and
+    ``file_size_limit`` apply: there are no container-wide memory or process
+    limits and no cgroup, which is why :func:`task_checker.create_runner`
+    never picks it on its own. It offers
+    the same ``run_code`` / ``run_batch`` API as
+    :class:`docker_runner.DockerTaskRunner`.
+    """
+
+    def __init__(self, preload: tuple[str, ...] = DEFAULT_PRELOAD, file_size_limit: str = "64m"):
+        self.zygote = _shared_zygote(tuple(preload))
+        self.file_size_limit = parse_size(file_size_limit)
+        self._inflight: set[int] = set()
+        self._inflight_lock = threading.Lock()
+        self._killed = False
+
+    def backend_name(self) -> str:
+        """Short name of the backend runs go to."""
+        return "zygote"
+
+    def fingerprint(self) -> str:
+        """Describe the execution environment; part of result cache keys."""
+        return f"zygote:{sys.version}:{self.file_size_limit}"
+
+    def kill_active(self) -> None:
+        """Forcefully stop every run in flight; the runner refuses new runs afterwards."""
+        with self._inflight_lock:
+            self._killed = True
+            inflight = list(self._inflight)
+        for req_id in inflight:
+            self.zygote.cancel(req_id)
+
+    def _finished(self, req_id: int) -> None:
+        with self._inflight_lock:
+            self._inflight.discard(req_id)
+        _sandbox_slots.release()
+
+    def _run_many(self, workdir: str, entry: str, cases: list[list[str]], timeout: int,
+                  limits: list[Limits | None] | None, expected: list | None) -> List[Dict[str, Any]]:
+        with staged_expected(workdir, expected, len(cases)) as expected_files:
+            return self._submit_all(workdir, entry, cases, timeout, limits, expected_files)
+
+    def _submit_all(self, workdir: str, entry: str, cases: list[list[str]], timeout: int,
+                    limits: list[Limits | None] | None,
+                    expected_files: list[str | None]) -> List[Dict[str, Any]]:
+        futures = []
+        for args, lim, want in zip(cases, limits or [None] * len(cases), expected_files):
+            lim = lim or Limits()
+            _sandbox_slots.acquire()
+            try:
+                with self._inflight_lock:
+                    if self._killed:
+                        raise RuntimeError("runner was killed")
+                    req_id, future = self.zygote.submit(workdir, entry, args, lim.time or timeout,
+                                                        lim.cpu, lim.memory_kb, self.file_size_limit,
+                                                        want)
+                    self._inflight.add(req_id)
+            except Exception:
+                _sandbox_slots.release()
+                raise
+            future.add_done_callback(lambda _f, rid=req_id: self._finished(rid))
+            futures.append(future)
+        return [f.result() for f in futures]
+
+    def run_code(
+        self,
+        code: str | None = None,
+        *,
+        dir_path: str | Path | None = None,
+        entry: str = "main.py",
+        args: list[str] | None = None,
+        timeout: int = 5,
+        limits: Limits | None = None,
+        expected=None,
+    ) -> Dict[str, Any]:
+        """Run the solution once; see :meth:`DockerTaskRunner.run_code`."""
+        return self.run_batch(code, dir_path=dir_path, entry=entry, cases=[args or []],
+                              timeout=timeout, limits=[limits], expected=[expected])[0]
+
+    def run_batch(
+        self,
+        code: str | None = None,
+        *,
+        dir_path: str | Path | None = None,
+        entry: str = "main.py",
+        cases: list[list[str]],
+        timeout: int = 5,
+        limits: list[Limits | None] | None = None,
+        expected: list | None = None,
+    ) -> List[Dict[str, Any]]:
+        """Run the solution once per element of ``cases``; see :meth:`DockerTaskRunner.run_batch`.
+
+        Cases are forked concurrently, bounded by the host-wide sandbox cap.
+        """
+        if not cases:
+            return []
+        if dir_path is None:
+            if code is None:
+                raise ValueError("code must be provided when dir_path is None")
+            with tempfile.TemporaryDirectory() as tmpdir:
+                Path(tmpdir, "main.py").write_text(code)
+                return self._run_many(tmpdir, "main.py", cases, timeout, limits, expected)
+
+        workdir = Path(dir_path)
+        if not workdir.is_dir():
+            raise FileNotFoundError(f"Directory not found: {workdir}")
+        return self._run_many(str(workdir), entry, cases, timeout, limits, expected)